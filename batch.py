@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+"""Renders many shorts at once.
+
+Every job goes through the stages script -> tts -> background -> transcribe ->
+render -> captions. Each stage has its own worker threads and a bounded input
+queue, so the network bound stages of one job overlap with the CPU bound
+render of another one.
+
+    python batch.py jobs.jsonl --workers tts=4 render=2
+
+Input is a JSONL or CSV file whose rows have either a "topic" (the script is
+generated with ChatGPT) or a "text", and optionally an "id" and a "title".
+"""
+import argparse
+import csv
+import json
+import os
+import queue
+import re
+import sys
+import threading
+import time
+import traceback
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from utils import settings
+from utils.console import print_markdown, print_step, print_substep
+from utils.tracing import tracer
+
+DEFAULT_WORKERS = {
+    "script": 4,
+    "tts": 2,
+    "background": 2,
+    "transcribe": 1,
+    "render": 1,
+    "captions": 1,
+}
+
+_download_lock = threading.Lock()
+
+
+def read_jobs(input_path: str) -> List[Dict]:
+    """Reads the jobs of a JSONL or CSV file."""
+    with open(input_path, encoding="utf-8", newline="") as f:
+        if input_path.lower().endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    jobs = []
+    for row in rows:
+        if not row.get("topic") and not row.get("text"):
+            raise ValueError(f"Every job needs a topic or a text: {row}")
+        jobs.append({
+            "content": {
+                "id": row.get("id") or re.sub(r"[^\w\s-]", "", str(uuid.uuid4())),
+                "title": row.get("title") or str(uuid.uuid4()),
+                "text": row.get("text"),
+            },
+            "topic": row.get("topic"),
+            "timings": {},
+        })
+    return jobs
+
+
+def stage_script(job: Dict):
+    from video.openai import ask_chatgpt
+
+    if not job["content"]["text"]:
+        job["content"]["text"] = ask_chatgpt(job["topic"])
+
+
+def stage_tts(job: Dict):
+    from utils.workspace import Workspace
+    from voices.voice_generator import save_text_to_mp3
+
+    # waits while the other jobs hold the total workspace quota
+    job["workspace"] = Workspace(job["content"]["id"]).create()
+    [job["total_duration"], job["number_of_clips"]] = save_text_to_mp3(job["content"])
+
+
+def stage_background(job: Dict):
+    from video.video_background import (
+        chop_background,
+        download_background_audio,
+        download_background_video,
+        get_background_config,
+    )
+
+    bg_config = {
+        "video": get_background_config("video"),
+        "audio": get_background_config("audio"),
+    }
+    # two jobs picking the same background must not download it twice
+    with _download_lock:
+        download_background_video(bg_config["video"])
+        download_background_audio(bg_config["audio"])
+    chop_background(bg_config, job["total_duration"], job["content"])
+
+
+def stage_transcribe(job: Dict):
+    from video.audio_bus import AudioBus, use_audio_bus
+    from video.video_creator import transcribe_job
+
+    # one bus per job, the render stage reuses the voice decoded here
+    job["bus"] = AudioBus(job["content"]["id"], job["number_of_clips"]) if use_audio_bus() else None
+    job["word_timings"] = transcribe_job(job["content"], job["number_of_clips"], job["bus"])
+
+
+def stage_render(job: Dict):
+    from video.video_creator import render_video
+
+    job["path"] = f"results/{job['content']['id']}"
+    os.makedirs(job["path"], exist_ok=True)
+    job["video_path"] = render_video(
+        job["content"],
+        job["number_of_clips"],
+        job["total_duration"],
+        job["path"],
+        job["word_timings"],
+        job.pop("bus", None),  # the samples are freed once the render is done
+    )
+
+
+def stage_captions(job: Dict):
+    from video.video_creator import caption_video, remove_temporary_files
+
+    if settings.config["settings"].get("render_mode", "legacy") == "single_pass":
+        job["output"] = job["video_path"]  # already captioned by the render graph
+    else:
+        job["output"] = caption_video(job["word_timings"], job["video_path"], job["path"])
+    remove_temporary_files(job["content"]["id"])
+
+
+STAGES: Dict[str, Callable[[Dict], None]] = {
+    "script": stage_script,
+    "tts": stage_tts,
+    "background": stage_background,
+    "transcribe": stage_transcribe,
+    "render": stage_render,
+    "captions": stage_captions,
+}
+
+
+class Stage:
+    """A pool of worker threads consuming jobs from a bounded queue."""
+
+    def __init__(self, name: str, func: Callable[[Dict], None], workers: int, queue_size: int):
+        self.name = name
+        self.func = func
+        self.inbox = queue.Queue(maxsize=queue_size)
+        self.threads = [
+            threading.Thread(target=self._work, name=f"{name}-{i}", daemon=True) for i in range(workers)
+        ]
+        self.outbox = None
+
+    def start(self, outbox: queue.Queue):
+        self.outbox = outbox
+        for thread in self.threads:
+            thread.start()
+
+    def close(self):
+        """Waits for the queued jobs to be processed and stops the workers."""
+        for _ in self.threads:
+            self.inbox.put(None)
+        for thread in self.threads:
+            thread.join()
+
+    def _work(self):
+        while True:
+            job = self.inbox.get()
+            if job is None:
+                return
+            if "error" not in job:  # a failed job skips the remaining stages
+                start = time.perf_counter()
+                try:
+                    with tracer.span(self.name, cat="batch", job=job["content"]["id"]):
+                        self.func(job)
+                    if "workspace" in job and self.name != "captions":
+                        job["workspace"].check()
+                except (Exception, SystemExit) as e:
+                    job["error"] = f"{self.name}: {e!r}"
+                    traceback.print_exc()
+                job["timings"][self.name] = round(time.perf_counter() - start, 3)
+            self.outbox.put(job)
+
+
+def write_manifest(job: Dict) -> Dict:
+    """Writes results/{id}/manifest.json and returns its contents."""
+    content = job["content"]
+    manifest = {
+        "id": content["id"],
+        "title": content["title"],
+        "topic": job["topic"],
+        "status": "failed" if "error" in job else "done",
+        "error": job.get("error"),
+        "duration": job.get("total_duration"),
+        "number_of_clips": job.get("number_of_clips"),
+        "output": job.get("output"),
+        "timings": job["timings"],
+    }
+    os.makedirs(f"results/{content['id']}", exist_ok=True)
+    with open(f"results/{content['id']}/manifest.json", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=4)
+    return manifest
+
+
+def run_batch(jobs: List[Dict], workers: Dict[str, int], queue_size: int = 2) -> List[Dict]:
+    """Pushes the jobs through the stage pipeline.
+
+    Returns:
+        List[Dict]: The manifest of every job, in completion order
+    """
+    stages = [
+        Stage(name, func, workers.get(name, DEFAULT_WORKERS[name]), queue_size)
+        for name, func in STAGES.items()
+    ]
+    done = queue.Queue()
+    for stage, following in zip(stages, stages[1:] + [None]):
+        stage.start(following.inbox if following is not None else done)
+
+    manifests = []
+
+    def collect():
+        while True:
+            job = done.get()
+            if job is None:
+                return
+            if "error" in job:
+                from video.video_creator import remove_temporary_files
+
+                remove_temporary_files(job["content"]["id"])
+            manifest = write_manifest(job)
+            manifests.append(manifest)
+            print_substep(
+                f"Job {manifest['id']} {manifest['status']} ({len(manifests)}/{len(jobs)})",
+                style="bold green" if manifest["status"] == "done" else "bold red",
+            )
+
+    collector = threading.Thread(target=collect, name="collector", daemon=True)
+    collector.start()
+
+    for job in jobs:
+        stages[0].inbox.put(job)  # blocks while the first stage is saturated
+    for stage in stages:
+        stage.close()
+    done.put(None)
+    collector.join()
+    return manifests
+
+
+def parse_workers(values: List[str]) -> Dict[str, int]:
+    workers = {}
+    for value in values:
+        name, _, count = value.partition("=")
+        if name not in STAGES or not count.isdigit() or int(count) < 1:
+            raise argparse.ArgumentTypeError(f"Invalid --workers value '{value}', expected stage=N")
+        workers[name] = int(count)
+    return workers
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render a batch of shorts")
+    parser.add_argument("input", help="JSONL or CSV file with a topic or a text per job")
+    parser.add_argument(
+        "--workers", nargs="*", default=[], help=f"Workers per stage, e.g. tts=4. Stages: {', '.join(STAGES)}"
+    )
+    parser.add_argument("--queue-size", type=int, default=2, help="Jobs waiting in front of each stage")
+    args = parser.parse_args()
+
+    print_markdown("## shorts-ai-generator batch", padding=1)
+    directory = Path().absolute()
+    config = settings.check_toml(
+        f"{directory}/utils/.config.template.toml", f"{directory}/config.toml"
+    )
+    config is False and sys.exit()
+
+    from utils.workspace import install_cleanup_handlers, sweep_orphans
+
+    # scratch files of unfinished jobs are removed at exit, those of crashed runs now
+    install_cleanup_handlers()
+    sweep_orphans()
+
+    jobs = read_jobs(args.input)
+    print_step(f"Rendering {len(jobs)} shorts 🎥")
+    start = time.perf_counter()
+    try:
+        workers = parse_workers(args.workers)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+    manifests = run_batch(jobs, workers, args.queue_size)
+    elapsed = time.perf_counter() - start
+
+    os.makedirs("results", exist_ok=True)
+    batch_manifest = f"results/batch-{time.strftime('%Y%m%d-%H%M%S')}.jsonl"
+    with open(batch_manifest, "w", encoding="utf-8") as f:
+        for manifest in manifests:
+            f.write(json.dumps(manifest, ensure_ascii=False) + "\n")
+
+    tracer.write(batch_manifest.replace(".jsonl", ".trace.json"))
+
+    done = sum(manifest["status"] == "done" for manifest in manifests)
+    print_step(
+        f"Done! 🎉 {done}/{len(manifests)} shorts in {elapsed:.0f}s "
+        f"({done / elapsed * 3600:.1f} shorts/hour). Manifest: {batch_manifest}"
+    )
@@ -0,0 +1,78 @@
+"""Local stand-in for an OpenAI-compatible chat completions endpoint.
+
+POST /v1/chat/completions answers with one of the canned scripts after a
+configurable latency, with a usage block so the token budget can be settled.
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.fixtures import SCRIPTS
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """Serves on 127.0.0.1 in a background thread, use base_url as the client's base_url.
+
+    Args:
+        latency (float): Seconds every response is delayed
+        jitter (float): Extra random delay, up to this many seconds
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.2):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.latency = latency
+        self.jitter = jitter
+        self.requests = 0
+        self._thread = threading.Thread(target=self.serve_forever, name="FakeOpenAIServer", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        server: FakeOpenAIServer = self.server
+        server.requests += 1
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(server.latency + random.uniform(0, server.jitter))
+
+        prompt = " ".join(message["content"] for message in request["messages"])
+        answer = random.choice(list(SCRIPTS.values()))
+        prompt_tokens, completion_tokens = len(prompt) // 4, len(answer) // 4
+        body = json.dumps({
+            "id": f"chatcmpl-{server.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request["model"],
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": answer},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
@@ -0,0 +1,123 @@
+"""Local stand-in for the TikTok TTS endpoint.
+
+Answers every POST with a valid mp3 of a sine tone whose length follows the
+text (about 15 characters per second), after a configurable latency. A script
+of outcomes ("ok", a status code like 503, or "stall" to outlast the client's
+timeout) replaces the random failures for checks that need exact sequences.
+"""
+import json
+import random
+import subprocess
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Union
+
+CHARS_PER_SECOND = 15
+
+
+@lru_cache(maxsize=None)
+def sine_mp3(duration: float) -> bytes:
+    return subprocess.run(
+        [
+            "ffmpeg", "-v", "error", "-f", "lavfi", "-i", f"sine=frequency=220:duration={duration}",
+            "-c:a", "libmp3lame", "-b:a", "64k", "-f", "mp3", "pipe:1",
+        ],
+        check=True,
+        stdout=subprocess.PIPE,
+    ).stdout
+
+
+class FakeTTSServer(ThreadingHTTPServer):
+    """Serves on 127.0.0.1 in a background thread.
+
+    Args:
+        latency (float): Seconds every response is delayed
+        jitter (float): Extra random delay, up to this many seconds
+        failure_rate (float): Share of requests answered with a 503
+        script (List, optional): Outcome of each request in order, "ok" once it runs out
+        stall (float): Seconds a "stall" outcome waits before dropping the connection
+        audio (bytes, optional): Body of the successful responses instead of a sine mp3
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        latency: float = 0.2,
+        jitter: float = 0.1,
+        failure_rate: float = 0.0,
+        script: Optional[List[Union[str, int]]] = None,
+        stall: float = 5.0,
+        audio: Optional[bytes] = None,
+    ):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.script = list(script or [])
+        self.stall = stall
+        self.audio = audio
+        self.requests = 0
+        # client (host, port) of every request, the same port means a reused connection
+        self.connections: List[tuple] = []
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self.serve_forever, name="FakeTTSServer", daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/api/generate"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+
+    def next_outcome(self) -> Union[str, int]:
+        with self._lock:
+            self.requests += 1
+            if self.script:
+                return self.script.pop(0)
+        return 503 if random.random() < self.failure_rate else "ok"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # keep-alive, so clients that pool their connections can be told apart from ones that don't
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server: FakeTTSServer = self.server
+        outcome = server.next_outcome()
+        server.connections.append(self.client_address)
+        params = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(server.latency + random.uniform(0, server.jitter))
+
+        if outcome == "stall":
+            time.sleep(server.stall)
+            self.close_connection = True
+            return
+        if outcome != "ok":
+            self.send_response(int(outcome))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if server.audio is not None:
+            body = server.audio
+        else:
+            # rounded so the generated mp3s can be reused between requests
+            duration = max(round(len(params["text"]) / CHARS_PER_SECOND, 1), 0.5)
+            body = sine_mp3(duration)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
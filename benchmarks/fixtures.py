@@ -0,0 +1,87 @@
+"""Synthetic assets for the benchmarks, generated locally with ffmpeg's lavfi sources."""
+import json
+import os
+import subprocess
+from typing import Dict, List
+
+SCRIPTS: Dict[str, str] = {
+    "es": (
+        "¿Sabías que un solo titán promedio es lo suficientemente fuerte como para arrasar con una ciudad "
+        "entera? ¡Es fascinante! La serie no solo es conocida por sus impresionantes batallas, sino también "
+        "por su profunda historia y giros emocionales. Uno de los hechos más curiosos es que los titanes "
+        "fueron inspirados por la sensación de vulnerabilidad del creador. Además, todos los titanes tienen "
+        "una debilidad crucial: un punto detrás de su cuello que, si es cortado, los acabará al instante."
+    ),
+    "en": (
+        "Did you know that the series almost didn't happen? The creator considered shelving the project "
+        "after the initial pitch was rejected. However, he fine-tuned his concept and it became a massive "
+        "global sensation. Here's a fun fact: the famous gear actually draws inspiration from ancient "
+        "martial arts. The fluidity and speed are reminiscent of ninjutsu! And speaking of characters, did "
+        "you notice how the hero was nearly written as a titan from the very first chapter?"
+    ),
+    "pt": (
+        "Você sabia que a série quase não aconteceu? O criador pensou em engavetar o projeto depois que a "
+        "primeira proposta foi rejeitada. Mas ele refinou o conceito e virou um fenômeno mundial. Curiosidade: "
+        "o famoso equipamento foi inspirado em artes marciais antigas, e a fluidez lembra o ninjutsu!"
+    ),
+    "fr": (
+        "Saviez-vous que la série a failli ne jamais voir le jour ? Son créateur a envisagé d'abandonner le "
+        "projet après un premier refus. Il a retravaillé son concept et c'est devenu un phénomène mondial. "
+        "Anecdote : le célèbre équipement s'inspire d'arts martiaux anciens, sa fluidité rappelle le ninjutsu !"
+    ),
+}
+
+
+def _ffmpeg(*args: str):
+    subprocess.run(["ffmpeg", "-v", "error", "-y", *args], check=True)
+
+
+def background_video(path: str, duration: int, W: int = 1920, H: int = 1080, fps: int = 30):
+    """Landscape testsrc2 clip, 2s GOP like a typical download."""
+    if not os.path.exists(path):
+        _ffmpeg(
+            "-f", "lavfi", "-i", f"testsrc2=size={W}x{H}:rate={fps}:duration={duration}",
+            "-c:v", "libx264", "-preset", "ultrafast", "-g", str(2 * fps), "-pix_fmt", "yuv420p", path,
+        )
+
+
+def background_audio(path: str, duration: int, source: str = "sine"):
+    """Music bed: a sine tone, or pink noise with source="noise"."""
+    if not os.path.exists(path):
+        lavfi = (
+            f"anoisesrc=color=pink:duration={duration}:amplitude=0.2"
+            if source == "noise"
+            else f"sine=frequency=330:duration={duration}"
+        )
+        _ffmpeg("-f", "lavfi", "-i", lavfi, "-ac", "2", "-c:a", "libmp3lame", "-b:a", "128k", path)
+
+
+def build_workspace(root: str, video_lengths: List[int], audio_length: int = 900) -> Dict[str, Dict]:
+    """Creates the assets and config files the pipeline expects, relative to root.
+
+    Returns:
+        Dict: {"video": {name: config}, "audio": {name: config}} as in config/background_*.json
+    """
+    os.makedirs(f"{root}/assets/backgrounds/video", exist_ok=True)
+    os.makedirs(f"{root}/assets/backgrounds/audio", exist_ok=True)
+    os.makedirs(f"{root}/config", exist_ok=True)
+
+    videos = {"__comment": "benchmark fixtures"}
+    for length in video_lengths:
+        name = f"testsrc-{length}s"
+        videos[name] = ["lavfi://testsrc2", f"{name}.mp4", "bench", "center"]
+        background_video(f"{root}/assets/backgrounds/video/bench-{name}.mp4", length)
+
+    audios = {"__comment": "benchmark fixtures"}
+    for source in ("sine", "noise"):
+        name = f"{source}-bed"
+        audios[name] = [f"lavfi://{source}", f"{name}.mp3", "bench"]
+        background_audio(f"{root}/assets/backgrounds/audio/bench-{name}.mp3", audio_length, source)
+
+    with open(f"{root}/config/background_videos.json", "w") as f:
+        json.dump(videos, f, indent=4)
+    with open(f"{root}/config/background_audios.json", "w") as f:
+        json.dump(audios, f, indent=4)
+
+    del videos["__comment"], audios["__comment"]
+    return {"video": videos, "audio": audios}
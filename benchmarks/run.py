@@ -0,0 +1,349 @@
+#!/usr/bin/env python
+"""Offline benchmark of the pipeline stages.
+
+Everything runs against generated assets in a scratch workspace: testsrc2
+backgrounds of several lengths, sine and pink noise music beds, a local
+TikTok TTS server and a local OpenAI-compatible endpoint with configurable
+latency. Nothing is downloaded, so the whisper model has to be in ./models
+already.
+
+    python -m benchmarks.run --lengths 30,120,600 --latency 0.2 --model tiny
+
+Every stage is timed on its own, then the whole short is rendered end to end
+once per render mode. Results and a fingerprint of the machine are written to
+benchmarks/results/, with the trace of the run next to them.
+"""
+import argparse
+import asyncio
+import difflib
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+import traceback
+from datetime import datetime
+from importlib import metadata
+from pathlib import Path
+from typing import Callable, Dict, List
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from benchmarks.fake_openai import FakeOpenAIServer
+from benchmarks.fake_tts import FakeTTSServer
+from benchmarks.fixtures import SCRIPTS, build_workspace
+from utils import settings
+from utils.cpu_budget import cgroup_cpu_limit
+
+PACKAGES = ("numpy", "moviepy", "ffmpeg-python", "openai-whisper", "faster-whisper", "ctranslate2", "torch", "requests")
+
+
+def timing_agreement(reference: List[Dict], other: List[Dict]) -> Dict:
+    """How closely the word timings of other follow reference, over the words both recognized."""
+    normalize = lambda word: re.sub(r"[^\w]", "", word["word"]).lower()  # noqa: E731
+    matcher = difflib.SequenceMatcher(None, [normalize(w) for w in reference], [normalize(w) for w in other])
+    deltas = []
+    for block in matcher.get_matching_blocks():
+        for i in range(block.size):
+            deltas.append(abs(reference[block.a + i]["start"] - other[block.b + i]["start"]))
+            deltas.append(abs(reference[block.a + i]["end"] - other[block.b + i]["end"]))
+    return {
+        "words": len(other),
+        "reference_words": len(reference),
+        "matched_words": len(deltas) // 2,
+        "mean_timing_delta_s": round(statistics.mean(deltas), 4) if deltas else None,
+    }
+
+
+def default_config(overrides: Dict) -> Dict:
+    """The defaults of utils/.config.template.toml, with overrides applied per section."""
+    import toml
+
+    config = {}
+
+    def set_default(path, value):
+        if isinstance(value, dict) and "default" in value:
+            section = config
+            for key in path[:-1]:
+                section = section.setdefault(key, {})
+            section[path[-1]] = value["default"]
+
+    _crawl_options(toml.load(REPO_ROOT / "utils/.config.template.toml"), set_default)
+    for section, values in overrides.items():
+        target = config
+        for key in section.split("."):
+            target = target.setdefault(key, {})
+        target.update(values)
+    return config
+
+
+def _crawl_options(obj: Dict, func, path=None):
+    """Like settings.crawl, but stops at the option tables of the template."""
+    path = path or []
+    for key, value in obj.items():
+        if isinstance(value, dict) and not any(isinstance(v, dict) for v in value.values()) and path:
+            func(path + [key], value)
+        elif isinstance(value, dict):
+            _crawl_options(value, func, path + [key])
+
+
+def fingerprint() -> Dict:
+    """What the numbers depend on: hardware, OS, interpreter and tool versions."""
+    cpu_model = platform.processor()
+    memory_mb = None
+    try:
+        with open("/proc/cpuinfo") as cpuinfo:
+            cpu_model = next(
+                (line.split(":", 1)[1].strip() for line in cpuinfo if line.startswith("model name")), cpu_model
+            )
+        with open("/proc/meminfo") as meminfo:
+            memory_mb = int(meminfo.readline().split()[1]) // 1024
+    except OSError:
+        pass
+
+    def command_output(*args):
+        try:
+            return subprocess.run(args, capture_output=True, text=True, cwd=REPO_ROOT).stdout.strip()
+        except OSError:
+            return None
+
+    packages = {}
+    for package in PACKAGES:
+        try:
+            packages[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            packages[package] = None
+
+    return {
+        "hostname": platform.node(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_model": cpu_model,
+        "cpu_count": os.cpu_count(),
+        "cpu_affinity": len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else None,
+        "cgroup_cpu_limit": cgroup_cpu_limit(),
+        "memory_mb": memory_mb,
+        "python": sys.version.split()[0],
+        "ffmpeg": (command_output("ffmpeg", "-version") or "").split("\n")[0],
+        "git_commit": command_output("git", "rev-parse", "HEAD"),
+        "packages": packages,
+    }
+
+
+class Bench:
+    """Runs callables, keeps their wall times and carries on when one fails."""
+
+    def __init__(self):
+        self.results: Dict[str, Dict] = {}
+
+    def measure(self, name: str, func: Callable, repeat: int = 1, **info):
+        times = []
+        value = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            try:
+                value = func()
+            except Exception as e:  # noqa: BLE001 - a failed stage is a result too
+                traceback.print_exc()
+                self.results[name] = {"error": f"{type(e).__name__}: {e}", **info}
+                return None
+            times.append(time.perf_counter() - start)
+        self.results[name] = {
+            "runs": repeat,
+            "min_s": round(min(times), 4),
+            "median_s": round(statistics.median(times), 4),
+            "max_s": round(max(times), 4),
+            **info,
+        }
+        print(f"{name}: {self.results[name]['median_s']:.3f}s")
+        return value
+
+
+def run(args) -> Dict:
+    work_dir = Path(args.work_dir).resolve()
+    work_dir.mkdir(parents=True, exist_ok=True)
+    lengths = [int(length) for length in args.lengths.split(",")]
+    backgrounds = build_workspace(str(work_dir), lengths)
+    if not (work_dir / "models").exists() and (REPO_ROOT / "models").exists():
+        (work_dir / "models").symlink_to(REPO_ROOT / "models")
+
+    # the pipeline works with paths relative to the current directory
+    os.chdir(work_dir)
+    settings.config = default_config({
+        "settings": {"resolution_w": args.width, "resolution_h": args.height, "encode_profile": args.profile},
+        "settings.background": {"background_audio_volume": 0.15, "background_proxy": False, "background_audio_pcm": True},
+        "settings.captions": {"backend": args.captions},
+        "settings.transcription": {"timing": "whisper", "model": args.model, "worker_address": ""},
+        "settings.tts": {"tiktok_sessionid": "bench", "tiktok_voice": "es_002", "cache_enabled": False},
+    })
+
+    from text.text_captions import generate_captions, transcribe_audio
+    from video.video_background import chop_background
+    from video.video_creator import make_final_video, prepare_audio, prepare_background
+    from voices.tiktok import TikTok, chunk_text
+
+    bench = Bench()
+    W, H = args.width, args.height
+    audio_choice = next(iter(backgrounds["audio"].values()))
+
+    for lang in args.langs.split(","):
+        script = SCRIPTS[lang]
+        bench.measure(f"chunk_text[{lang}]", lambda: [chunk_text(script) for _ in range(1000)], chars=len(script))
+
+    with FakeOpenAIServer(latency=args.openai_latency, jitter=args.jitter) as server:
+        from video.script_service import ScriptCache, ScriptService
+
+        # half of the topics repeat, as when a batch is re-run with a few new rows
+        topics = [f"Topic {i % (args.scripts // 2 or 1)}" for i in range(args.scripts)]
+        service = ScriptService(api_key="bench", base_url=server.base_url, requests_per_minute=6000)
+        bench.measure(
+            f"ask_chatgpt[sequential x{args.scripts}]",
+            lambda: [service.ask_sync(f"{topic} sequential") for topic in topics],
+            latency=args.openai_latency,
+        )
+        requests = server.requests
+        bench.measure(
+            f"ask_chatgpt[concurrent x{args.scripts}]",
+            lambda: asyncio.run(service.ask_many(topics)),
+            latency=args.openai_latency,
+        )
+        bench.results[f"ask_chatgpt[concurrent x{args.scripts}]"]["requests"] = server.requests - requests
+        cached_service = ScriptService(api_key="bench", base_url=server.base_url, cache=ScriptCache("cache/scripts"))
+        asyncio.run(cached_service.ask_many(topics))  # fills the cache
+        bench.measure(
+            f"ask_chatgpt[cached x{args.scripts}]", lambda: asyncio.run(cached_service.ask_many(topics))
+        )
+
+    with FakeTTSServer(latency=args.latency, jitter=args.jitter) as server:
+        lang = args.langs.split(",")[0]
+        id = f"bench-{lang}"
+        tts = TikTok(id, uri_base=server.url)
+        voices = bench.measure(
+            "get_voices", lambda: tts.get_voices(SCRIPTS[lang], voice="es_002"), latency=args.latency
+        )
+        if voices is None:
+            return bench.results
+        total_duration, number_of_clips = voices
+        bench.results["get_voices"]["requests"] = server.requests
+
+        settings.config["settings"]["tts"]["cache_enabled"] = True
+        cached_tts = TikTok(f"{id}-cached", uri_base=server.url)
+        cached_tts.get_voices(SCRIPTS[lang], voice="es_002")  # fills the cache
+        bench.measure("get_voices[cached]", lambda: cached_tts.get_voices(SCRIPTS[lang], voice="es_002"))
+        settings.config["settings"]["tts"]["cache_enabled"] = False
+
+        for length in lengths:
+            video_choice = backgrounds["video"][f"testsrc-{length}s"]
+            bg_config = {"video": video_choice, "audio": audio_choice}
+            bench.measure(
+                f"chop_background[{length}s]",
+                lambda: chop_background(bg_config, total_duration, {"id": id}),
+                repeat=args.repeat,
+                audio_seconds=total_duration,
+            )
+            bench.measure(
+                f"prepare_background[{length}s]",
+                lambda: prepare_background(id, W, H, total_duration),
+                repeat=args.repeat,
+            )
+
+        bench.measure("prepare_audio", lambda: prepare_audio(id, number_of_clips), repeat=args.repeat)
+        # the fake TTS speaks in tones, --speech gives the backends a real voice to agree on
+        speech = str(Path(args.speech).resolve()) if args.speech else f"assets/temp/{id}/audio.mp3"
+        timings_by_backend = {}
+        for backend in args.backends.split(","):
+            settings.config["settings"]["transcription"]["backend"] = backend
+            timings_by_backend[backend] = bench.measure(
+                f"transcribe_audio[{backend}, {args.model}]",
+                lambda: transcribe_audio(speech),
+                audio_seconds=total_duration,
+            )
+        settings.config["settings"]["transcription"]["backend"] = args.backends.split(",")[0]
+        word_timings = next((timings for timings in timings_by_backend.values() if timings is not None), None)
+        reference = timings_by_backend.get("whisper")
+        for backend, timings in timings_by_backend.items():
+            if backend != "whisper" and reference is not None and timings is not None:
+                bench.results[f"transcribe_audio[{backend}, {args.model}]"].update(timing_agreement(reference, timings))
+        if word_timings is not None:
+            os.makedirs(f"results/{id}", exist_ok=True)
+            bench.measure(
+                f"generate_captions[{args.captions}]",
+                lambda: generate_captions(
+                    word_timings, f"assets/temp/{id}/background_noaudio.mp4", f"results/{id}/captions.mp4"
+                ),
+                words=len(word_timings),
+            )
+
+        # legacy runs whisper and the encoder side by side: once as plain threads sized to the
+        # whole machine, as before the cpu budget, and once with the budget splitting the cores
+        for name, render_mode, cpu_budget in (
+            ("legacy[threads]", "legacy", False),
+            ("legacy[cpu_budget]", "legacy", True),
+            ("single_pass", "single_pass", True),
+        ):
+            settings.config["settings"]["render_mode"] = render_mode
+            settings.config["settings"]["cpu"]["enabled"] = cpu_budget
+            settings.config["settings"]["cpu"]["transcription_process"] = cpu_budget
+            e2e_id = f"bench-e2e-{render_mode}"
+            bg_config = {"video": backgrounds["video"][f"testsrc-{lengths[-1]}s"], "audio": audio_choice}
+
+            def end_to_end():
+                duration, clips = TikTok(e2e_id, uri_base=server.url).get_voices(SCRIPTS[lang], voice="es_002")
+                chop_background(bg_config, duration, {"id": e2e_id})
+                os.makedirs(f"results/{e2e_id}", exist_ok=True)
+                return make_final_video({"id": e2e_id, "text": SCRIPTS[lang]}, clips, duration, f"results/{e2e_id}")
+
+            bench.measure(f"end_to_end[{name}]", end_to_end, audio_seconds=total_duration)
+
+    threads = bench.results.get("end_to_end[legacy[threads]]")
+    budgeted = bench.results.get("end_to_end[legacy[cpu_budget]]")
+    if threads and budgeted and "median_s" in threads and "median_s" in budgeted:
+        bench.results["cpu_budget_speedup"] = round(threads["median_s"] / budgeted["median_s"], 3)
+        print(f"cpu_budget_speedup: {bench.results['cpu_budget_speedup']:.2f}x")
+
+    return bench.results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lengths", default="30,120,600", help="Lengths of the background videos, in seconds")
+    parser.add_argument("--langs", default="es,en,pt,fr", help=f"Scripts to chunk, of {','.join(SCRIPTS)}")
+    parser.add_argument("--latency", type=float, default=0.2, help="Latency of the fake TTS server, in seconds")
+    parser.add_argument("--openai-latency", type=float, default=1.0, help="Latency of the fake OpenAI server, in seconds")
+    parser.add_argument("--scripts", type=int, default=16, help="Scripts requested by the ask_chatgpt stages")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Random extra latency, in seconds")
+    parser.add_argument("--model", default="tiny", help="Whisper model used by transcribe_audio")
+    parser.add_argument("--backends", default="whisper,faster_whisper", help="Transcription backends to compare")
+    parser.add_argument("--speech", default=None, help="Recording transcribed instead of the fake TTS audio")
+    parser.add_argument("--captions", default="ass", choices=["ass", "moviepy"], help="Captions backend")
+    parser.add_argument("--profile", default="draft", help="Encode profile, see video/encode_profiles.py")
+    parser.add_argument("--width", type=int, default=1080)
+    parser.add_argument("--height", type=int, default=1920)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of the cheap stages")
+    parser.add_argument("--work-dir", default=str(REPO_ROOT / "benchmarks/.work"))
+    parser.add_argument("--output", default=None, help="Result file, benchmarks/results/<time>.json by default")
+    args = parser.parse_args()
+
+    output = Path(args.output or REPO_ROOT / f"benchmarks/results/{datetime.now():%Y%m%d-%H%M%S}.json").resolve()
+    started = datetime.now().isoformat(timespec="seconds")
+    results = run(args)
+
+    from utils.tracing import tracer
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as output_file:
+        json.dump(
+            {"started": started, "machine": fingerprint(), "options": vars(args), "results": results},
+            output_file,
+            indent=4,
+        )
+    tracer.write(str(output.with_suffix(".trace.json")))
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+"""Startup benchmark: how long importing the entry points takes and what it loads.
+
+Every module is imported a few times in a fresh interpreter with
+python -X importtime. The median import time, the peak RSS and the heavy
+modules that got imported are checked against benchmarks/startup_budget.json,
+and the exit status is 1 when a budget is exceeded:
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --update   # re-baseline on this machine
+
+Heavy dependencies (torch, whisper, moviepy, yt_dlp, openai...) must be
+imported where they are used, the "forbidden" list of the budget catches an
+import that moves back to module level.
+"""
+import argparse
+import json
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+BUDGET_PATH = REPO_ROOT / "benchmarks/startup_budget.json"
+# --update leaves this much room over the measured numbers
+HEADROOM = 1.25
+
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+PROBE = (
+    "import {module}\n"
+    "try:\n"
+    "    import resource\n"
+    "    print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)\n"
+    "except ImportError:\n"
+    "    print(0)\n"
+)
+
+
+def measure_once(module: str) -> Dict:
+    """Imports module in a new interpreter.
+
+    Returns:
+        Dict: import_ms, rss_mb, the imported modules and their cumulative import time
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE.format(module=module)],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if process.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{process.stderr[-2000:]}")
+
+    modules = {}
+    total_us = 0
+    for line in process.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match is None:
+            continue
+        _, cumulative, indent, name = match.groups()
+        modules[name] = int(cumulative)
+        if not indent:  # top level, its cumulative time includes everything below it
+            total_us += int(cumulative)
+    return {
+        "import_ms": total_us / 1000,
+        "rss_mb": int(process.stdout.strip().splitlines()[-1]) / 1024,
+        "modules": modules,
+    }
+
+
+def measure(module: str, runs: int) -> Dict:
+    samples = [measure_once(module) for _ in range(runs)]
+    modules = samples[-1]["modules"]
+    return {
+        "runs": runs,
+        "import_ms": round(statistics.median(s["import_ms"] for s in samples), 1),
+        "rss_mb": round(max(s["rss_mb"] for s in samples), 1),
+        "modules": len(modules),
+        "slowest": {
+            name: round(us / 1000, 1)
+            for name, us in sorted(modules.items(), key=lambda item: item[1], reverse=True)[:15]
+        },
+        "imported": sorted(modules),
+    }
+
+
+def check(module: str, result: Dict, budget: Dict) -> List[str]:
+    """The budgets result exceeds, as messages."""
+    failures = []
+    if result["import_ms"] > budget["import_ms"]:
+        failures.append(f"{module}: import took {result['import_ms']}ms, budget {budget['import_ms']}ms")
+    if result["rss_mb"] > budget["rss_mb"]:
+        failures.append(f"{module}: peak RSS {result['rss_mb']}MB, budget {budget['rss_mb']}MB")
+    imported = set(result["imported"])
+    for heavy in budget.get("forbidden", []):
+        if heavy in imported:
+            failures.append(f"{module}: imports {heavy} at startup")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Imports per module, the median is kept")
+    parser.add_argument("--budget", default=str(BUDGET_PATH))
+    parser.add_argument("--update", action="store_true", help="Write the measured numbers plus headroom as the budget")
+    parser.add_argument("--output", default=None, help="Also write the full results to this JSON file")
+    args = parser.parse_args()
+
+    with open(args.budget) as budget_file:
+        budgets = json.load(budget_file)
+
+    results = {}
+    failures = []
+    for module, budget in budgets.items():
+        result = results[module] = measure(module, args.runs)
+        print(f"{module}: {result['import_ms']}ms, {result['rss_mb']}MB peak RSS, {result['modules']} modules")
+        for name, ms in list(result["slowest"].items())[:5]:
+            print(f"    {name}: {ms}ms")
+        if args.update:
+            budget["import_ms"] = round(result["import_ms"] * HEADROOM)
+            budget["rss_mb"] = round(result["rss_mb"] * HEADROOM)
+        failures += check(module, result, budget)
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=4)
+    if args.update:
+        with open(args.budget, "w") as budget_file:
+            json.dump(budgets, budget_file, indent=4)
+            budget_file.write("\n")
+        print(f"Budget written to {args.budget}")
+    for failure in failures:
+        print(f"OVER BUDGET {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
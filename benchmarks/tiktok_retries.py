@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+"""Checks the TikTok provider's retries against the local stand-in server.
+
+Every scenario scripts the outcomes of the server's requests and asserts how
+many attempts the client made, the backoff it slept between them (recorded,
+not slept, so the check takes seconds) and that one thread reuses a single
+pooled connection. The exit status is 1 when a scenario fails:
+
+    python -m benchmarks.tiktok_retries
+"""
+import random
+import sys
+import tempfile
+from pathlib import Path
+from typing import List
+from unittest import mock
+
+from benchmarks.fake_tts import FakeTTSServer
+from utils import settings
+
+AUDIO = b"ID3" + bytes(256)
+RETRIES = 3
+TIMEOUT = 0.5
+
+
+def make_tts(server: FakeTTSServer, retries: int = RETRIES):
+    from voices.tiktok import TikTok
+
+    settings.config = {
+        "settings": {
+            "tts": {
+                "tiktok_sessionid": "bench",
+                "tiktok_retries": retries,
+                "tiktok_timeout": TIMEOUT,
+            }
+        }
+    }
+    return TikTok("bench", uri_base=server.url)
+
+
+def run(script: List, retries: int = RETRIES):
+    """Synthesizes one chunk against a server following script.
+
+    Returns:
+        tuple: whether the chunk was written, the requests the server got, the backoff sleeps
+    """
+    sleeps = []
+    with FakeTTSServer(latency=0, jitter=0, script=script, stall=TIMEOUT * 4, audio=AUDIO) as server:
+        tts = make_tts(server, retries)
+        with tempfile.TemporaryDirectory() as temp, mock.patch("voices.tiktok.time.sleep", sleeps.append):
+            filename = Path(temp) / "chunk.mp3"
+            written = tts.synthesize_chunk_to("hello there", None, str(filename))
+            if written and filename.read_bytes() != AUDIO:
+                raise AssertionError("the written chunk is not the served audio")
+        return written, server.requests, sleeps
+
+
+def check_backoff(sleeps: List[float]) -> List[str]:
+    failures = []
+    for attempt, delay in enumerate(sleeps):
+        base = min(2 ** attempt, 30)
+        if not 0.5 * base <= delay <= 1.5 * base:
+            failures.append(f"backoff {attempt} slept {delay:.2f}s, expected {0.5 * base}-{1.5 * base}s")
+    return failures
+
+
+def scenarios() -> List[str]:
+    failures = []
+
+    def expect(name: str, condition: bool, detail: str):
+        print(f"{'ok  ' if condition else 'FAIL'} {name}: {detail}")
+        if not condition:
+            failures.append(f"{name}: {detail}")
+
+    written, requests, sleeps = run([503, 500, "ok"])
+    expect("5xx retried", written and requests == 3, f"written={written}, {requests} requests")
+    failures += check_backoff(sleeps)
+
+    written, requests, sleeps = run(["stall", "ok"])
+    expect("timeout retried", written and requests == 2, f"written={written}, {requests} requests")
+    failures += check_backoff(sleeps)
+
+    written, requests, sleeps = run([429, "ok"])
+    expect("429 retried", written and requests == 2, f"written={written}, {requests} requests")
+
+    written, requests, sleeps = run([503] * (RETRIES + 5))
+    expect(
+        "gives up after the retries",
+        not written and requests == RETRIES + 1 and len(sleeps) == RETRIES,
+        f"written={written}, {requests} requests, {len(sleeps)} sleeps",
+    )
+    failures += check_backoff(sleeps)
+
+    written, requests, sleeps = run([400])
+    expect("4xx not retried", not written and requests == 1 and not sleeps, f"{requests} requests")
+
+    # the same attempt drawing the same delay every time would mean the jitter is gone
+    random.seed()
+    delays = {round(run([503, "ok"])[2][0], 3) for _ in range(5)}
+    expect("backoff jittered", len(delays) > 1, f"{len(delays)} distinct first delays out of 5")
+
+    with FakeTTSServer(latency=0, jitter=0, audio=AUDIO) as server:
+        tts = make_tts(server)
+        with tempfile.TemporaryDirectory() as temp:
+            for index in range(5):
+                tts.synthesize_chunk_to("hello there", None, str(Path(temp) / f"{index}.mp3"))
+        ports = {port for _, port in server.connections}
+        expect("connection reused", len(ports) == 1, f"{server.requests} requests over {len(ports)} connections")
+
+    return failures
+
+
+def main():
+    failures = scenarios()
+    for failure in failures:
+        print(f"FAILED {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,8 @@ from utils import settings
 
 from utils.console import print_markdown
 from utils.ffmpeg_install import ffmpeg_install
+from utils.tracing import tracer
+from utils.workspace import Workspace, install_cleanup_handlers, sweep_orphans
 from voices.voice_generator import save_text_to_mp3
 from video.openai import ask_chatgpt
 from video.video_background import (
@@ -25,22 +27,25 @@ from utils.console import (
     print_substep
 )
 from video.video_creator import make_final_video
+from video.render_graph import RenderError
+from video.stream_render import make_streaming_video
 from os.path import exists  # Needs to be imported specifically
 import os
 
-from moviepy.config import change_settings
-change_settings({"IMAGEMAGICK_BINARY": r"C:\\Program Files\\ImageMagick-7.1.1-Q16-HDRI\\magick.exe"})
-
 __VERSION__ = "3.3.0"
 
-print_markdown("## shorts-ai-generator", padding=1)
-print_markdown("### Thanks for using this tool! Feel free to contribute to this project on GitHub!", padding=1)
-
 if __name__ == "__main__":
+    # not at import: the worker processes of utils.cpu_budget import this module too
+    print_markdown("## shorts-ai-generator", padding=1)
+    print_markdown("### Thanks for using this tool! Feel free to contribute to this project on GitHub!", padding=1)
+
     if sys.version_info.major != 3 or sys.version_info.minor not in [10, 11, 12]:
         print("Hey! Unfortunately, this program only works on Python 3.10|11|12.")
         sys.exit()
 
+    from moviepy.config import change_settings
+    change_settings({"IMAGEMAGICK_BINARY": r"C:\\Program Files\\ImageMagick-7.1.1-Q16-HDRI\\magick.exe"})
+
     ffmpeg_install()
 
     directory = Path().absolute()
@@ -66,7 +71,15 @@ if __name__ == "__main__":
         "text": response
     }
     
-    [total_duration, number_of_clips] = save_text_to_mp3(content)
+    # the scratch files of the short are removed at exit, whatever the outcome
+    install_cleanup_handlers()
+    sweep_orphans()
+    workspace = Workspace(content["id"]).create()
+
+    streaming = settings.config["settings"].get("render_mode", "legacy") == "streaming"
+    if not streaming:
+        [total_duration, number_of_clips] = save_text_to_mp3(content)
+        workspace.check()
 
     bg_config = {
         "video": get_background_config("video"),
@@ -82,11 +95,24 @@ if __name__ == "__main__":
     download_background_video(bg_config["video"])
     download_background_audio(bg_config["audio"])
 
-    background = chop_background(bg_config, total_duration, content)
+    try:
+        if streaming:
+            # the voice is synthesized while the video is encoded
+            video_path = make_streaming_video(content, bg_config, defaultPath, workspace)
+        else:
+            background = chop_background(bg_config, total_duration, content)
+            workspace.check()
+
+            video_path = make_final_video(
+                obj=content, 
+                length=total_duration, 
+                number_of_clips=number_of_clips,
+                path=defaultPath
+            )
+    except RenderError as e:
+        print_substep("The render failed", style="bold red")
+        print(e)  # ffmpeg's stderr as is, not as console markup
+        sys.exit(1)
 
-    [video_path, audio_path] = make_final_video(
-        obj=content, 
-        length=total_duration, 
-        number_of_clips=number_of_clips,
-        path=defaultPath
-    )
\ No newline at end of file
+    tracer.write(f"{defaultPath}/trace.json")
+    print_substep(f"Stage timings written to {defaultPath}/trace.json (open it in chrome://tracing or ui.perfetto.dev)")
\ No newline at end of file
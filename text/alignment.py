@@ -0,0 +1,140 @@
+import json
+import re
+from difflib import SequenceMatcher
+from typing import Dict, List
+
+import ffmpeg
+import numpy as np
+
+from utils.console import print_step, print_substep
+from utils.tracing import traced
+
+SAMPLE_RATE = 16000
+FRAME_SECONDS = 0.01
+
+
+def decode_pcm(path: str, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """Decodes an audio file into mono float32 samples."""
+    out, _ = (
+        ffmpeg.input(path)
+        .output("pipe:", format="f32le", ac=1, ar=sample_rate)
+        .run(capture_stdout=True, quiet=True)
+    )
+    return np.frombuffer(out, dtype=np.float32)
+
+
+def voiced_frames(samples: np.ndarray, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """Returns a boolean array telling which 10ms frames contain speech.
+
+    A frame is voiced when its energy is within 35dB of the loud frames of the clip.
+    """
+    frame = int(sample_rate * FRAME_SECONDS)
+    n_frames = len(samples) // frame
+    if n_frames == 0:
+        return np.zeros(0, dtype=bool)
+    frames = samples[: n_frames * frame].reshape(n_frames, frame)
+    energy = 10 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+    threshold = max(np.percentile(energy, 95) - 35, -60)
+    return energy > threshold
+
+
+def _word_weight(word: str) -> float:
+    """Relative speaking time of a word: its letters, plus a pause after punctuation."""
+    letters = len(re.sub(r"\W", "", word)) or 1
+    pause = 3 if word[-1] in ".!?…" else 1.5 if word[-1] in ",;:" else 0
+    return letters + pause
+
+
+def align_chunk(text: str, samples: np.ndarray, offset: float = 0, sample_rate: int = SAMPLE_RATE) -> List[Dict]:
+    """Distributes the words of text over the voiced frames of samples.
+
+    Each word gets a share of the speech time proportional to its length, so
+    silences fall between words instead of stretching them.
+    """
+    words = text.split()
+    voiced = voiced_frames(samples, sample_rate)
+    if not words or not voiced.any():
+        return []
+
+    voiced_idx = np.flatnonzero(voiced)
+    weights = np.array([_word_weight(w) for w in words], dtype=np.float64)
+    bounds = np.concatenate(([0], np.cumsum(weights) / weights.sum())) * len(voiced_idx)
+    bounds = np.round(bounds).astype(int)
+
+    word_timings = []
+    for word, lo, hi in zip(words, bounds[:-1], bounds[1:]):
+        hi = max(hi, lo + 1)
+        first = voiced_idx[min(lo, len(voiced_idx) - 1)]
+        last = voiced_idx[min(hi, len(voiced_idx)) - 1]
+        word_timings.append({
+            'word': word,
+            'start': offset + first * FRAME_SECONDS,
+            'end': offset + (last + 1) * FRAME_SECONDS
+        })
+    return word_timings
+
+
+def align_script(chunks: List[Dict]) -> List[Dict]:
+    """Aligns the known text of every TTS chunk with its audio.
+
+    Args:
+        chunks (List[Dict]): [{'text', 'path', 'duration'}] in playback order
+
+    Returns:
+        List[Dict]: [{'word', 'start', 'end'}], the same format as transcribe_audio
+    """
+    word_timings = []
+    offset = 0
+    for chunk in chunks:
+        samples = decode_pcm(chunk["path"])
+        word_timings += align_chunk(chunk["text"], samples, offset)
+        offset += chunk.get("duration") or len(samples) / SAMPLE_RATE
+    return word_timings
+
+
+@traced()
+def align_job(id: str) -> List[Dict]:
+    """align_script over the chunks written by the TTS engine for the given short."""
+    print_step("Aligning the script with the audio 📁")
+    with open(f"assets/temp/{id}/mp3/chunks.json", encoding="utf-8") as manifest_file:
+        chunks = json.load(manifest_file)
+    word_timings = align_script(chunks)
+    print_substep("> Finished aligning the script with the audio 📁")
+    return word_timings
+
+
+def _normalize(word: str) -> str:
+    return re.sub(r"\W", "", word).casefold()
+
+
+def correct_word_timings(word_timings: List[Dict], script: str) -> List[Dict]:
+    """Replaces the words recognized by whisper with the words of the script,
+    keeping whisper's timings.
+
+    Misrecognized runs get the script words spread over the same time span,
+    words whisper missed are squeezed between their neighbours and words whisper
+    made up are dropped.
+    """
+    script_words = script.split()
+    matcher = SequenceMatcher(
+        a=[_normalize(w["word"]) for w in word_timings],
+        b=[_normalize(w) for w in script_words],
+        autojunk=False,
+    )
+    corrected = []
+    for tag, a0, a1, b0, b1 in matcher.get_opcodes():
+        if b0 == b1:  # whisper made it up
+            continue
+        if a0 < a1:
+            start, end = word_timings[a0]["start"], word_timings[a1 - 1]["end"]
+        else:  # whisper missed it
+            start = word_timings[a0 - 1]["end"] if a0 > 0 else 0
+            end = word_timings[a0]["start"] if a0 < len(word_timings) else start
+        if tag == "equal":
+            for timing, word in zip(word_timings[a0:a1], script_words[b0:b1]):
+                corrected.append({'word': word, 'start': timing["start"], 'end': timing["end"]})
+            continue
+        step = (end - start) / (b1 - b0)
+        for i, word in enumerate(script_words[b0:b1]):
+            corrected.append({'word': word, 'start': start + i * step, 'end': start + (i + 1) * step})
+    return corrected
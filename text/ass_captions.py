@@ -0,0 +1,156 @@
+import os
+import tempfile
+from typing import Dict, List
+
+import ffmpeg
+
+from utils import settings
+from utils.console import print_step, print_substep
+from video.encode_profiles import encode_args
+
+ASS_HEADER = """[Script Info]
+ScriptType: v4.00+
+PlayResX: {W}
+PlayResY: {H}
+WrapStyle: 0
+ScaledBorderAndShadow: yes
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Default,{font},{fontsize},&H00FFFFFF,&H00FFFFFF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,{outline},0,5,20,20,20,1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+"""
+
+
+def _ass_time(seconds: float) -> str:
+    """Formats seconds as an ASS timestamp (H:MM:SS.cc)."""
+    centiseconds = max(0, int(round(seconds * 100)))
+    hours, centiseconds = divmod(centiseconds, 360000)
+    minutes, centiseconds = divmod(centiseconds, 6000)
+    secs, centiseconds = divmod(centiseconds, 100)
+    return f"{hours}:{minutes:02d}:{secs:02d}.{centiseconds:02d}"
+
+
+def _ass_color(rgb: str) -> str:
+    """Converts a "R,G,B" string into an ASS &HBBGGRR& color."""
+    r, g, b = (int(c) for c in rgb.split(","))
+    return f"&H{b:02X}{g:02X}{r:02X}&"
+
+
+def _escape(word: str) -> str:
+    """Makes a word safe as ASS dialogue text.
+
+    libass has no escape for braces, they would open an override block, so
+    they become fullwidth lookalikes. A zero-width joiner after every backslash
+    keeps it from starting a \\N or \\h sequence.
+    """
+    return word.strip().replace("{", "\uff5b").replace("}", "\uff5d").replace("\\", "\\\u200d")
+
+
+def group_phrases(word_timings: List[Dict], words_per_phrase: int = 3, max_gap: float = 0.6):
+    """Groups consecutive words into phrases shown together on screen.
+
+    A phrase is closed when it reaches words_per_phrase words or when the pause
+    before the next word is longer than max_gap seconds.
+
+    Returns:
+        List[List[Dict]]: The phrases, each one a list of word timings
+    """
+    phrases = []
+    current = []
+    for word_info in word_timings:
+        if not word_info["word"].strip():
+            continue
+        if current and (
+            len(current) >= words_per_phrase or word_info["start"] - current[-1]["end"] > max_gap
+        ):
+            phrases.append(current)
+            current = []
+        current.append(word_info)
+    if current:
+        phrases.append(current)
+    return phrases
+
+
+def write_ass(
+    word_timings: List[Dict],
+    path: str,
+    W: int,
+    H: int,
+    font: str = "Poppins Black",
+    fontsize: int = 50,
+    outline: int = 2,
+    words_per_phrase: int = 1,
+    highlight_color: str = "255,221,0",
+) -> str:
+    """Writes the word timings as an ASS subtitle track.
+
+    Every phrase produces one event per word, showing the whole phrase with the
+    word being spoken painted with highlight_color.
+
+    Returns:
+        str: The path of the written file
+    """
+    highlight = _ass_color(highlight_color)
+    lines = [ASS_HEADER.format(W=W, H=H, font=font, fontsize=fontsize, outline=outline)]
+    for phrase in group_phrases(word_timings, words_per_phrase):
+        for i, active in enumerate(phrase):
+            # keep the phrase on screen until the next word starts
+            end = phrase[i + 1]["start"] if i + 1 < len(phrase) else active["end"]
+            words = [
+                f"{{\\c{highlight}}}{_escape(w['word'])}{{\\c&HFFFFFF&}}" if w is active else _escape(w["word"])
+                for w in phrase
+            ]
+            lines.append(
+                f"Dialogue: 0,{_ass_time(active['start'])},{_ass_time(max(end, active['end']))},Default,,0,0,0,,{' '.join(words)}\n"
+            )
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(lines)
+    return path
+
+
+def write_ass_from_settings(word_timings: List[Dict], path: str, W: int, H: int) -> str:
+    """write_ass using the [settings.captions] section of the config."""
+    captions = settings.config["settings"].get("captions", {})
+    return write_ass(
+        word_timings,
+        path,
+        W,
+        H,
+        words_per_phrase=int(captions.get("words_per_phrase", 1)),
+        highlight_color=captions.get("highlight_color", "255,221,0"),
+    )
+
+
+def burn_captions(word_timings: List[Dict], video_path: str, output_path: str):
+    """Burns the captions into the video with ffmpeg's ass filter, copying the audio if it has one.
+
+    Raises:
+        ffmpeg.Error: When the encode fails, its stderr is printed first
+    """
+    print_step("Generating captions for the video 📁")
+    probe = ffmpeg.probe(video_path)
+    video_stream = next(s for s in probe["streams"] if s["codec_type"] == "video")
+    W, H = int(video_stream["width"]), int(video_stream["height"])
+
+    fd, ass_path = tempfile.mkstemp(suffix=".ass")
+    os.close(fd)
+    try:
+        write_ass_from_settings(word_timings, ass_path, W, H)
+        print_substep("> Finished generating captions for the video 📁")
+        source = ffmpeg.input(video_path)
+        ffmpeg.output(
+            source.video.filter("ass", ass_path),
+            source["a?"],  # -map 0:a?, a video without audio is captioned too
+            output_path,
+            **{**encode_args(audio=False), "c:a": "copy"},
+        ).overwrite_output().run(quiet=True)
+    except ffmpeg.Error as e:
+        print(e.stderr.decode("utf8"))
+        raise
+    finally:
+        os.remove(ass_path)
+    print_step("Done! 🎉 The video is in the results folder 📁")
@@ -0,0 +1,118 @@
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+class SpriteCache:
+    """LRU bounded cache of rasterized words.
+
+    Every distinct (word, font, fontsize, color, stroke_color, stroke_width) is
+    rasterized by ImageMagick once and kept as a premultiplied float32 sprite.
+    """
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self.renders = 0  # number of ImageMagick rasterizations
+        self._sprites: "OrderedDict[Tuple, Tuple[np.ndarray, np.ndarray]]" = OrderedDict()
+
+    def get(
+        self,
+        word: str,
+        font: str = "Poppins-Black",
+        fontsize: int = 50,
+        color: str = "white",
+        stroke_color: str = "black",
+        stroke_width: int = 2,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns (premultiplied rgb, alpha) for the word, rasterizing it on a miss."""
+        key = (word, font, fontsize, color, stroke_color, stroke_width)
+        sprite = self._sprites.get(key)
+        if sprite is not None:
+            self._sprites.move_to_end(key)
+            return sprite
+
+        # moviepy takes seconds to import, only the moviepy captions backend needs it
+        from moviepy.editor import TextClip
+
+        text_clip = TextClip(
+            word,
+            fontsize=fontsize,
+            color=color,
+            font=font,
+            stroke_color=stroke_color,
+            stroke_width=stroke_width,
+        )
+        alpha = text_clip.mask.get_frame(0).astype(np.float32)[:, :, None]
+        rgb = text_clip.get_frame(0).astype(np.float32) * alpha
+        text_clip.close()
+        self.renders += 1
+
+        sprite = (rgb, alpha)
+        self._sprites[key] = sprite
+        if len(self._sprites) > self.max_entries:
+            self._sprites.popitem(last=False)
+        return sprite
+
+    def __len__(self):
+        return len(self._sprites)
+
+
+class IntervalIndex:
+    """Word timings sorted by start time, answering "which words are on screen at t"
+    by only looking at the words that started in the last max-duration seconds.
+    """
+
+    def __init__(self, word_timings: List[Dict]):
+        self._words = sorted(
+            (w for w in word_timings if w["word"].strip() and w["end"] > w["start"]),
+            key=lambda w: w["start"],
+        )
+        self._starts = [w["start"] for w in self._words]
+        self._max_duration = max((w["end"] - w["start"] for w in self._words), default=0)
+
+    def active(self, t: float) -> List[Dict]:
+        lo = bisect_left(self._starts, t - self._max_duration)
+        hi = bisect_right(self._starts, t)
+        return [w for w in self._words[lo:hi] if w["end"] > t]
+
+
+class CaptionCompositor:
+    """Draws the active words of each frame from the sprite cache, blending them
+    in place on the frame buffer.
+
+    Use it as a moviepy frame filter: video.fl(compositor)
+    """
+
+    def __init__(self, word_timings: List[Dict], cache: SpriteCache, **text_style):
+        self.index = IntervalIndex(word_timings)
+        self.cache = cache
+        self.text_style = text_style
+
+    def __call__(self, get_frame, t):
+        frame = get_frame(t)
+        active = self.index.active(t)
+        if not active:
+            return frame
+
+        frame = np.array(frame, copy=True)  # moviepy frames may be read-only
+        H, W = frame.shape[:2]
+        for word_info in active:
+            rgb, alpha = self.cache.get(word_info["word"].strip(), **self.text_style)
+            h, w = alpha.shape[:2]
+            # centered, cropped to the frame bounds
+            x, y = (W - w) // 2, (H - h) // 2
+            fx, fy = max(x, 0), max(y, 0)
+            sx, sy = fx - x, fy - y
+            w, h = min(w - sx, W - fx), min(h - sy, H - fy)
+            if w <= 0 or h <= 0:
+                continue
+            region = frame[fy:fy + h, fx:fx + w]
+            a = alpha[sy:sy + h, sx:sx + w]
+            region[:] = region * (1 - a) + rgb[sy:sy + h, sx:sx + w]
+        return frame
+
+
+# shared between videos rendered by the same process
+sprite_cache = SpriteCache()
@@ -1,70 +1,117 @@
-import whisper
-from moviepy.editor import VideoFileClip, TextClip, CompositeVideoClip
+from typing import Union
+
+import numpy as np
+from text.alignment import align_job, correct_word_timings
+from text.ass_captions import burn_captions
+from text.caption_compositor import CaptionCompositor, sprite_cache
+from text.whisper_worker import transcribe_local, transcribe_remote
+from utils import settings
+from utils.cpu_budget import budget, budget_enabled, limit_threads, run_in_process
+from video.encode_profiles import moviepy_args
 from utils.console import (
     print_step,
     print_substep
 )
+from utils.tracing import traced
 
+@traced()
 def transcribe_audio(
-    audio_path: str,
+    audio_path: Union[str, np.ndarray],
 ):
+    """Word timings of audio_path, a file or 16kHz mono float32 samples."""
     print_step("Transcribing audio information using whisper 📁")
-    model = whisper.load_model(name="small", download_root="./models")
+    transcription = settings.config["settings"].get("transcription", {})
+    worker_address = transcription.get("worker_address", "")
+    # empty lets the model detect it
+    language = transcription.get("language", "es") or None
 
-    result = model.transcribe(
-        audio_path, 
-        word_timestamps=True, 
-        language="es"
-    )
+    if worker_address:
+        response = transcribe_remote(audio_path, worker_address, language)
+        word_timings = response["word_timings"]
+        print_substep(
+            f"> Worker inference took {response['inference_time']:.2f}s "
+            f"(queued {response['queue_time']:.2f}s, batch of {response['batch_size']}, "
+            f"{response['waiting']} more waiting)"
+        )
+    else:
+        backend = transcription.get("backend", "whisper")
+        model_name = transcription.get("model", "small")
+        options = {}
+        if backend == "faster_whisper":
+            options = {"compute_type": transcription.get("compute_type", "int8"), "vad": transcription.get("vad", True)}
+        args = (audio_path, backend, model_name, language, options)
+        with budget.stage("transcribe") as lease:
+            if budget_enabled() and settings.config["settings"].get("cpu", {}).get("transcription_process", False):
+                # a process of its own, pytorch's python side doesn't fight the encoder threads for the GIL
+                response = run_in_process(lease, transcribe_local, *args)
+            else:
+                if budget_enabled():
+                    limit_threads(lease.threads)
+                response = transcribe_local(*args)
+        word_timings = response["word_timings"]
+        print_substep(
+            f"> Model load took {response['load_time']:.2f}s, "
+            f"inference took {response['inference_time']:.2f}s on {lease.threads} threads"
+        )
 
-    # create dictionary
-    word_timings = []
-    for segment in result['segments']:
-        for word in segment['words']:
-            word_timings.append({
-                'word': word['word'], 
-                'start': word['start'], 
-                'end': word['end']
-            })
-    
     print_substep("> Finished transcribing audio information using whisper 📁")
     return word_timings
 
 
+def transcribes_locally() -> bool:
+    """Whether get_word_timings runs whisper in this machine, taking CPU from the other stages."""
+    transcription = settings.config["settings"].get("transcription", {})
+    return transcription.get("timing", "whisper") != "align" and not transcription.get("worker_address", "")
+
+
+def get_word_timings(
+    obj,
+    audio_path: str,
+):
+    """Word timings of the short, using the method set in [settings.transcription] timing.
+
+    "whisper" transcribes audio_path, "whisper_corrected" replaces the recognized
+    words with the ones of the script and "align" skips whisper altogether,
+    aligning the script with the TTS chunks.
+    """
+    timing = settings.config["settings"].get("transcription", {}).get("timing", "whisper")
+    if timing == "align":
+        return align_job(obj["id"])
+
+    word_timings = transcribe_audio(audio_path)
+    if timing == "whisper_corrected":
+        word_timings = correct_word_timings(word_timings, obj["text"])
+    return word_timings
+
+
+@traced()
 def generate_captions(
     word_timings,
     video_path: str,
     output_path: str,
 ):
-    print_step("Generating captions for the video 📁")
-    # read video
-    video = VideoFileClip(video_path)
-    # create text clips for each word and overlay them at the correct time
-    text_clips = []
-    for word_info in word_timings:
-        word = word_info['word']
-        start_time = word_info['start']
-        end_time = word_info['end']
+    with budget.stage("captions"):
+        if settings.config["settings"].get("captions", {}).get("backend", "moviepy") == "ass":
+            return burn_captions(word_timings, video_path, output_path)
+
+        from moviepy.editor import VideoFileClip
 
-        # create a textClip for each word, you can customize the font, size, position, etc.
-        text_clip = TextClip(
-            word, 
-            fontsize=50, 
-            color='white', 
-            font="Poppins-Black", 
-            stroke_color="black", 
+        print_step("Generating captions for the video 📁")
+        # read video
+        video = VideoFileClip(video_path)
+        # every distinct word is rasterized once, each frame only blends the words on screen
+        compositor = CaptionCompositor(
+            word_timings,
+            sprite_cache,
+            fontsize=50,
+            color='white',
+            font="Poppins-Black",
+            stroke_color="black",
             stroke_width=2
-        ) \
-            .set_position(('center', 'center')) \
-            .set_start(start_time) \
-            .set_end(end_time)
-        
-        # Append to list of text clips
-        text_clips.append(text_clip)
-    
-    print_substep("> Finished generating captions for the video 📁")
-    # # Combine the original video with the text clips
-    final_video = CompositeVideoClip([video] + text_clips)
-    final_video.write_videofile(output_path, fps=video.fps)
-    print_step("Done! 🎉 The video is in the results folder 📁")
+        )
 
+        print_substep("> Finished generating captions for the video 📁")
+        final_video = video.fl(compositor)
+        final_video.write_videofile(output_path, fps=video.fps, **moviepy_args())
+        print_substep(f"> Rasterized {sprite_cache.renders} distinct words 📁")
+        print_step("Done! 🎉 The video is in the results folder 📁")
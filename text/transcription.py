@@ -0,0 +1,202 @@
+"""Speech recognition engines behind the caption timings.
+
+Every backend returns the same [{'word', 'start', 'end'}] list:
+
+    whisper         openai-whisper, PyTorch fp32
+    faster_whisper  CTranslate2 int8 on the CPU, decoding only the speech
+                    regions found by its Silero VAD. transcribe_batch runs
+                    the audio of several jobs through shared batched passes
+"""
+import os
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_right
+from functools import lru_cache
+from typing import Dict, List, Optional, Union
+
+import ffmpeg
+import numpy as np
+
+SAMPLE_RATE = 16000
+MODELS_ROOT = "./models"
+# silence between the jobs of a batch, longer than the VAD's min_silence_duration_ms
+# so no speech segment spans two jobs
+BATCH_GAP_SECONDS = 2.0
+
+Audio = Union[str, np.ndarray]
+
+
+def load_audio(path: str) -> np.ndarray:
+    """Decodes path into the 16kHz mono float32 samples every backend takes."""
+    out, _ = (
+        ffmpeg.input(path)
+        .output("pipe:", f="f32le", ac=1, ar=SAMPLE_RATE)
+        .run(capture_stdout=True, quiet=True)
+    )
+    return np.frombuffer(out, dtype=np.float32)
+
+
+class TranscriptionBackend(ABC):
+    """A speech recognition engine with its model loaded, see get_backend.
+
+    Args:
+        model_name (str): Size or name of the model, e.g. "small"
+        options (Dict): Backend specific options from [settings.transcription]
+    """
+
+    name: str
+
+    def __init__(self, model_name: str, options: Dict):
+        self.model_name = model_name
+        self.options = options
+        self.load_time = 0.0
+        self._load_reported = False
+
+    def load(self):
+        start = time.perf_counter()
+        self._load()
+        self.load_time = time.perf_counter() - start
+
+    def take_load_time(self) -> float:
+        """load_time the first time it is asked for, 0 afterwards when the model was already warm."""
+        if self._load_reported:
+            return 0.0
+        self._load_reported = True
+        return self.load_time
+
+    @abstractmethod
+    def _load(self):
+        pass
+
+    @abstractmethod
+    def transcribe(self, audio: Audio, language: Optional[str] = None) -> List[Dict]:
+        """Word timings of audio, a file or 16kHz mono float32 samples.
+
+        Args:
+            audio: Path of the audio or its samples
+            language (str, optional): Language code of the speech, detected when None
+        """
+
+    def transcribe_batch(self, audios: List[np.ndarray], language: Optional[str] = None) -> List[List[Dict]]:
+        """Word timings of every audio in audios, 16kHz mono float32 samples of one language.
+
+        The default transcribes them one after another, backends that can share
+        model passes between several audios override it.
+        """
+        return [self.transcribe(audio, language) for audio in audios]
+
+
+class WhisperBackend(TranscriptionBackend):
+    name = "whisper"
+
+    def _load(self):
+        import whisper
+
+        self.model = whisper.load_model(name=self.model_name, download_root=MODELS_ROOT)
+
+    def transcribe(self, audio: Audio, language: Optional[str] = None) -> List[Dict]:
+        result = self.model.transcribe(audio, word_timestamps=True, language=language)
+        return [
+            {"word": word["word"], "start": word["start"], "end": word["end"]}
+            for segment in result["segments"]
+            for word in segment["words"]
+        ]
+
+
+class FasterWhisperBackend(TranscriptionBackend):
+    name = "faster_whisper"
+
+    def _load(self):
+        from faster_whisper import WhisperModel
+
+        self.model = WhisperModel(
+            self.model_name,
+            device="cpu",
+            compute_type=self.options.get("compute_type", "int8"),
+            # set by utils.cpu_budget.limit_threads, 0 lets CTranslate2 pick
+            cpu_threads=int(os.environ.get("OMP_NUM_THREADS", 0)),
+            download_root=MODELS_ROOT,
+        )
+
+    def transcribe(self, audio: Audio, language: Optional[str] = None) -> List[Dict]:
+        segments, _ = self.model.transcribe(
+            audio,
+            language=language,
+            word_timestamps=True,
+            vad_filter=self.options.get("vad", True),
+            vad_parameters={"min_silence_duration_ms": 500},
+            # greedy like openai-whisper's default, a clean TTS voice gains nothing from a beam
+            beam_size=1,
+        )
+        # segments is lazy, the decoding happens while iterating
+        return [
+            {"word": word.word, "start": float(word.start), "end": float(word.end)}
+            for segment in segments
+            for word in segment.words
+        ]
+
+    def transcribe_batch(self, audios: List[np.ndarray], language: Optional[str] = None) -> List[List[Dict]]:
+        """Transcribes the audios in shared passes of BatchedInferencePipeline.
+
+        The audios are joined with BATCH_GAP_SECONDS of silence, the pipeline
+        cuts the speech found by the VAD into windows decoded batch_size at a
+        time, and the words are split back per audio by their start time.
+        """
+        if len(audios) == 1:
+            return [self.transcribe(audios[0], language)]
+        from faster_whisper import BatchedInferencePipeline
+
+        gap = np.zeros(int(BATCH_GAP_SECONDS * SAMPLE_RATE), dtype=np.float32)
+        offsets = []
+        parts = []
+        position = 0
+        for audio in audios:
+            offsets.append(position / SAMPLE_RATE)
+            parts += [audio, gap]
+            position += len(audio) + len(gap)
+        if not hasattr(self, "pipeline"):
+            self.pipeline = BatchedInferencePipeline(model=self.model)
+        segments, _ = self.pipeline.transcribe(
+            np.concatenate(parts),
+            language=language,
+            word_timestamps=True,
+            vad_filter=True,  # the pipeline windows the audio on the VAD's speech regions
+            vad_parameters={"min_silence_duration_ms": 500},
+            beam_size=1,
+            batch_size=int(self.options.get("batch_size", 8)),
+        )
+
+        results: List[List[Dict]] = [[] for _ in audios]
+        for segment in segments:
+            for word in segment.words:
+                index = max(bisect_right(offsets, float(word.start)) - 1, 0)
+                results[index].append({
+                    "word": word.word,
+                    "start": float(word.start) - offsets[index],
+                    "end": float(word.end) - offsets[index],
+                })
+        return results
+
+
+TranscriptionBackends = {
+    "whisper": WhisperBackend,
+    "faster_whisper": FasterWhisperBackend,
+}
+
+
+@lru_cache(maxsize=None)
+def _cached_backend(name: str, model_name: str, options: tuple) -> TranscriptionBackend:
+    backend = TranscriptionBackends[name](model_name, dict(options))
+    backend.load()
+    return backend
+
+
+def get_backend(name: str = "whisper", model_name: str = "small", options: Optional[Dict] = None) -> TranscriptionBackend:
+    """The backend name with model_name loaded, once per process.
+
+    Raises:
+        ValueError: When name is not one of TranscriptionBackends
+    """
+    if name not in TranscriptionBackends:
+        raise ValueError(f"Unknown transcription backend {name!r}, expected one of {', '.join(TranscriptionBackends)}")
+    return _cached_backend(name, model_name, tuple(sorted((options or {}).items())))
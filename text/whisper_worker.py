@@ -0,0 +1,191 @@
+"""Long-lived transcription worker.
+
+The model is loaded once and requests from any number of jobs are served over
+a local socket. The requests queued together are transcribed in shared batched
+passes (faster_whisper, one at a time with openai-whisper):
+
+    python -m text.whisper_worker --port 6010 --model small --backend faster_whisper --batch-size 4
+
+Jobs point [settings.transcription] worker_address to "127.0.0.1:6010".
+"""
+import argparse
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Client, Listener
+from typing import Dict, List, Optional, Tuple
+
+from text.transcription import get_backend, load_audio
+from utils.console import print_step, print_substep
+
+DEFAULT_AUTHKEY = b"shorts-ai-generator"
+
+
+def transcribe_local(
+    audio,
+    backend: str = "whisper",
+    model_name: str = "small",
+    language: Optional[str] = None,
+    options: Optional[Dict] = None,
+) -> Dict:
+    """Transcribes audio (a path or 16kHz mono float32 samples) with the model of this process.
+
+    Picklable, so it can run in a worker process of utils.cpu_budget.
+
+    Returns:
+        Dict: word_timings plus load_time (0 when the model was already loaded) and inference_time
+    """
+    engine = get_backend(backend, model_name, options)
+    start = time.perf_counter()
+    word_timings = engine.transcribe(audio, language)
+    return {
+        "word_timings": word_timings,
+        "load_time": engine.take_load_time(),
+        "inference_time": time.perf_counter() - start,
+    }
+
+
+def parse_address(address: str) -> Tuple[str, int]:
+    host, port = address.rsplit(":", 1)
+    return host, int(port)
+
+
+def transcribe_remote(
+    audio_path,
+    address: str,
+    language: Optional[str] = None,
+    authkey: bytes = DEFAULT_AUTHKEY,
+) -> Dict:
+    """Sends audio_path to a running worker and waits for the transcription.
+
+    audio_path is either a file the worker can read or 16kHz mono float32 samples.
+
+    Returns:
+        Dict: word_timings plus the worker's load_time, queue_time, inference_time and batch_size
+    """
+    with Client(parse_address(address), authkey=authkey) as conn:
+        audio_key = "audio_path" if isinstance(audio_path, str) else "audio"
+        conn.send({audio_key: audio_path, "language": language})
+        response = conn.recv()
+    if "error" in response:
+        raise RuntimeError(f"Transcription worker failed: {response['error']}")
+    return response
+
+
+class TranscriptionWorker:
+    """Serves transcription requests with one warm model.
+
+    Every connection gets a handler thread that queues its requests. Their
+    audio is decoded by up to prefetch threads as soon as they arrive. The
+    inference thread takes up to batch_size queued requests at once and hands
+    those of the same language to the backend's transcribe_batch together, the
+    words are split back per request.
+    """
+
+    def __init__(
+        self,
+        model_name: str = "small",
+        batch_size: int = 4,
+        prefetch: int = 4,
+        backend: str = "whisper",
+        options: Optional[Dict] = None,
+    ):
+        self.model_name = model_name
+        self.backend = backend
+        self.options = options
+        self.batch_size = batch_size
+        self.prefetch = prefetch
+        self._requests = queue.Queue()
+        self._decoder = ThreadPoolExecutor(max_workers=prefetch)
+
+    def serve(self, address: Tuple[str, int], authkey: bytes = DEFAULT_AUTHKEY):
+        print_step(f"Loading {self.backend} model '{self.model_name}' 📁")
+        engine = get_backend(self.backend, self.model_name, self.options)
+        print_substep(f"Model loaded in {engine.take_load_time():.2f}s")
+
+        threading.Thread(target=self._inference_loop, name="WhisperInference", daemon=True).start()
+        with Listener(address, authkey=authkey) as listener:
+            print_substep(f"Transcription worker listening on {address[0]}:{address[1]}", style="bold green")
+            while True:
+                conn = listener.accept()
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        with conn:
+            while True:
+                try:
+                    request = conn.recv()
+                except EOFError:
+                    return
+                reply = queue.Queue(maxsize=1)
+                # decoded while the model is busy with the requests queued before it
+                audio = self._decoder.submit(
+                    lambda r: r["audio"] if "audio" in r else load_audio(r["audio_path"]), request
+                )
+                self._requests.put((request, audio, reply, time.perf_counter()))
+                conn.send(reply.get())
+
+    def _next_batch(self) -> List[Tuple]:
+        """The oldest request, waiting for one, plus up to batch_size - 1 already queued."""
+        batch = [self._requests.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._requests.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _inference_loop(self):
+        engine = get_backend(self.backend, self.model_name, self.options)
+        while True:
+            batch = self._next_batch()
+            by_language: Dict[Optional[str], List[Tuple]] = {}
+            for item in batch:
+                request, audio, reply, queued_at = item
+                try:
+                    audio.result()
+                except Exception as e:
+                    reply.put({"error": f"Could not decode the audio: {e}"})
+                    continue
+                by_language.setdefault(request.get("language"), []).append(item)
+
+            for language, items in by_language.items():
+                start = time.perf_counter()
+                try:
+                    results = engine.transcribe_batch([audio.result() for _, audio, _, _ in items], language)
+                except Exception as e:
+                    for _, _, reply, _ in items:
+                        reply.put({"error": str(e)})
+                    continue
+                inference_time = time.perf_counter() - start
+                load_time = engine.take_load_time()
+                for (_, _, reply, queued_at), word_timings in zip(items, results):
+                    reply.put({
+                        "word_timings": word_timings,
+                        "load_time": load_time,
+                        "queue_time": start - queued_at,
+                        # the shared pass, not this request's share of it
+                        "inference_time": inference_time,
+                        "batch_size": len(items),
+                        "waiting": self._requests.qsize(),
+                    })
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Persistent transcription worker")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6010)
+    parser.add_argument("--model", default="small")
+    parser.add_argument("--backend", default="whisper", choices=["whisper", "faster_whisper"])
+    parser.add_argument("--compute-type", default="int8", help="CTranslate2 compute type of faster_whisper")
+    parser.add_argument("--batch-size", type=int, default=4, help="Queued requests transcribed in the same pass")
+    parser.add_argument("--prefetch", type=int, default=4, help="Requests whose audio is decoded ahead")
+    args = parser.parse_args()
+
+    TranscriptionWorker(
+        args.model,
+        batch_size=args.batch_size,
+        prefetch=args.prefetch,
+        backend=args.backend,
+        options={"compute_type": args.compute_type} if args.backend == "faster_whisper" else None,
+    ).serve((args.host, args.port))
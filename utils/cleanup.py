@@ -1,20 +1,10 @@
-import os
-import shutil
-from os.path import exists
-
-
-def _listdir(d):  # listdir with full path
-    return [os.path.join(d, f) for f in os.listdir(d)]
+from utils.workspace import remove_workspace
 
 
 def cleanup(id) -> int:
-    """Deletes all temporary assets in assets/temp
+    """Deletes all temporary assets of the short in assets/temp/{id}, wherever its workspace lives
 
     Returns:
         int: How many files were deleted
     """
-    directory = f"../assets/temp/{id}/"
-    if exists(directory):
-        shutil.rmtree(directory)
-
-        return 1
+    return remove_workspace(id)
@@ -0,0 +1,244 @@
+"""Thread budgets of the CPU heavy stages.
+
+whisper (PyTorch) and ffmpeg both size their thread pools to every core of the
+machine by default, so running them side by side, or running several jobs at
+once, oversubscribes the CPU. Every stage reserves a lease instead: the usable
+cores (affinity mask and cgroup quota, not just cpu_count) are split between
+the leases alive at that moment by stage weight. ffmpeg gets the lease as
+-threads/-filter_threads, torch as set_num_threads, and with
+[settings.cpu] affinity every lease is pinned to its own cores.
+
+Nothing changes until [settings.cpu] enabled is set, every stage then uses
+all the cores as before. With transcription_process as well, transcription
+runs in a separate process so it doesn't share the GIL with the encoder's
+feed and progress threads.
+"""
+import math
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+
+from utils import settings
+
+# relative share of the cores each stage gets when it runs next to others
+STAGE_WEIGHTS: Dict[str, float] = {
+    "encode": 2,
+    "transcribe": 1,
+    "captions": 2,
+}
+
+_local = threading.local()
+
+
+def _cpu_settings() -> Dict:
+    # entry points like encode_profiles autotune run without loading config.toml
+    if not isinstance(settings.config, dict):
+        return {}
+    return settings.config.get("settings", {}).get("cpu", {})
+
+
+def affinity_cpus() -> List[int]:
+    """The cpus this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def cgroup_cpu_limit() -> Optional[float]:
+    """Cores allowed by the cgroup cpu quota (v2 cpu.max, or v1 cfs quota), None when unlimited."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as cpu_max:
+            quota, period = cpu_max.read().split()
+        if quota != "max":
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as quota_file:
+            quota = int(quota_file.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as period_file:
+            period = int(period_file.read())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+@lru_cache(maxsize=None)
+def _detected_cores() -> int:
+    cores = len(affinity_cpus())
+    limit = cgroup_cpu_limit()
+    if limit is not None:
+        cores = min(cores, max(1, math.ceil(limit)))
+    return cores
+
+
+def budget_enabled() -> bool:
+    return _cpu_settings().get("enabled", False)
+
+
+def usable_cores() -> int:
+    """Cores the stages share, [settings.cpu] cores or the detected ones."""
+    configured = int(_cpu_settings().get("cores", 0))
+    return configured if configured > 0 else _detected_cores()
+
+
+def limit_threads(threads: int):
+    """Caps the intra-op threads of torch and CTranslate2 in this process.
+
+    Libraries not imported yet read OMP_NUM_THREADS when they are, torch is
+    only resized when something already loaded it.
+    """
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(threads)
+
+
+class Lease:
+    """Share of the cores reserved by one stage, see CpuBudget.reserve.
+
+    Entering the lease makes it the current lease of the thread, which
+    encode_args and ProgressFfmpeg read, and leaving it releases the cores.
+    """
+
+    def __init__(self, budget: "CpuBudget", stage: str, weight: float):
+        self.budget = budget
+        self.stage = stage
+        self.weight = weight
+        self.threads = 1
+        self.cpus: Optional[List[int]] = None
+
+    def ffmpeg_global_args(self) -> List[str]:
+        return ["-filter_threads", str(self.threads), "-filter_complex_threads", str(self.threads)]
+
+    def pin(self, pid: int = 0):
+        """Restricts pid (this thread by default) to the cpus of the lease, when it has some."""
+        if self.cpus and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(pid, self.cpus)
+
+    def bind(self, func: Callable) -> Callable:
+        """func running with the lease entered, to be the target of a thread."""
+
+        def leased(*args, **kwargs):
+            with self:
+                return func(*args, **kwargs)
+
+        return leased
+
+    def __enter__(self) -> "Lease":
+        self._previous = current_lease()
+        _local.lease = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _local.lease = self._previous
+        self.budget.release(self)
+
+    def __repr__(self) -> str:
+        return f"Lease({self.stage}, threads={self.threads}, cpus={self.cpus})"
+
+
+class CpuBudget:
+    """Splits the usable cores between the leases alive in this process.
+
+    A lease's threads are fixed when it is reserved, ffmpeg can't resize its
+    pools mid-encode. Stages that run together must be reserved in the same
+    call so they split the cores evenly instead of the first one taking all.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._leases: List[Lease] = []
+
+    def reserve(self, *stages: str) -> List[Lease]:
+        with self._lock:
+            leases = [Lease(self, stage, STAGE_WEIGHTS.get(stage, 1)) for stage in stages]
+            self._leases += leases
+            cores = usable_cores()
+            total_weight = sum(lease.weight for lease in self._leases)
+            for lease in leases:
+                if not budget_enabled():
+                    lease.threads = cores  # every stage sized to the whole machine, as before the budget
+                    continue
+                lease.threads = max(1, round(cores * lease.weight / total_weight))
+                if _cpu_settings().get("affinity", False):
+                    lease.cpus = self._least_used_cpus(lease.threads, exclude=lease)
+        return leases
+
+    def _least_used_cpus(self, count: int, exclude: Lease) -> List[int]:
+        cpus = affinity_cpus()[:usable_cores()]
+        pinned = {cpu: 0 for cpu in cpus}
+        for lease in self._leases:
+            if lease is not exclude and lease.cpus:
+                for cpu in lease.cpus:
+                    if cpu in pinned:
+                        pinned[cpu] += 1
+        return sorted(sorted(cpus, key=lambda cpu: pinned[cpu])[:count])
+
+    def release(self, lease: Lease):
+        with self._lock:
+            if lease in self._leases:
+                self._leases.remove(lease)
+
+    @contextmanager
+    def stage(self, name: str):
+        """The lease of stage name, the one the caller entered or a new one."""
+        lease = current_lease()
+        if lease is not None and lease.stage == name:
+            yield lease
+            return
+        with self.reserve(name)[0] as lease:
+            yield lease
+
+
+budget = CpuBudget()
+
+
+def current_lease() -> Optional[Lease]:
+    return getattr(_local, "lease", None)
+
+
+def stage_threads() -> int:
+    """Threads of the current lease, all the usable cores outside of one."""
+    lease = current_lease()
+    return lease.threads if lease is not None else usable_cores()
+
+
+def _run_leased(threads: int, cpus: Optional[List[int]], func: Callable, args: tuple):
+    limit_threads(threads)
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    return func(*args)
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def process_pool() -> ProcessPoolExecutor:
+    """Worker processes of the CPU heavy python stages, kept warm between jobs."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawned, forking a process with running threads and a loaded torch is unsafe
+            _pool = ProcessPoolExecutor(
+                max_workers=int(_cpu_settings().get("processes", 1)),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def run_in_process(lease: Lease, func: Callable, *args):
+    """Runs func(*args) in a worker process limited to the threads and cpus of lease.
+
+    func and args must be picklable, func is looked up by module and name.
+    """
+    return process_pool().submit(_run_leased, lease.threads, lease.cpus, func, args).result()
@@ -1,11 +1,69 @@
+import json
 import os
+import shutil
 import subprocess
+import tempfile
 import zipfile
+from typing import Dict, Optional
 
-import requests
+PROBE_CACHE = "assets/cache/ffmpeg_probe.json"
+
+
+def _binary_key(name: str) -> Optional[Dict]:
+    path = shutil.which(name)
+    if path is None:
+        return None
+    path = os.path.realpath(path)
+    return {"path": path, "mtime": os.stat(path).st_mtime}
+
+
+def _encoders(ffmpeg_path: str) -> list:
+    out = subprocess.run(
+        [ffmpeg_path, "-hide_banner", "-encoders"], check=True, capture_output=True, text=True
+    ).stdout
+    # the list starts after the " ------" line of the legend
+    lines = out.split(" ------", 1)[-1].splitlines()
+    return [line.split()[1] for line in lines if len(line.split()) > 1]
+
+
+def probe_ffmpeg() -> Dict:
+    """Versions of ffmpeg and ffprobe and the encoders ffmpeg was built with.
+
+    Cached in assets/cache/ffmpeg_probe.json, keyed by the path and mtime of both
+    binaries, so the subprocesses only run again after ffmpeg is replaced.
+
+    Raises:
+        FileNotFoundError: When ffmpeg is not installed
+    """
+    key = {name: _binary_key(name) for name in ("ffmpeg", "ffprobe")}
+    if key["ffmpeg"] is None:
+        raise FileNotFoundError("ffmpeg")
+    try:
+        with open(PROBE_CACHE) as cache_file:
+            cached = json.load(cache_file)
+        if cached["key"] == key:
+            return cached["probe"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    probe = {}
+    for name, binary in key.items():
+        if binary is not None:
+            out = subprocess.run([binary["path"], "-version"], check=True, capture_output=True, text=True).stdout
+            probe[name] = out.splitlines()[0] if out else ""
+    probe["encoders"] = _encoders(key["ffmpeg"]["path"])
+
+    os.makedirs(os.path.dirname(PROBE_CACHE), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(PROBE_CACHE), suffix=".tmp")
+    with os.fdopen(fd, "w") as tmp_file:
+        json.dump({"key": key, "probe": probe}, tmp_file, indent=4)
+    os.replace(tmp_path, PROBE_CACHE)
+    return probe
 
 
 def ffmpeg_install_windows():
+    import requests
+
     try:
         ffmpeg_url = (
             "https://github.com/GyanD/codexffmpeg/releases/download/6.0/ffmpeg-6.0-full_build.zip"
@@ -103,13 +161,8 @@ def ffmpeg_install_mac():
 
 def ffmpeg_install():
     try:
-        # Try to run the FFmpeg command
-        subprocess.run(
-            ["ffmpeg", "-version"],
-            check=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
+        # Try to run the FFmpeg command, once per ffmpeg binary
+        probe_ffmpeg()
     except FileNotFoundError as e:
         # Check if there's ffmpeg.exe in the current directory
         if os.path.exists("./ffmpeg.exe"):
@@ -0,0 +1,139 @@
+import mmap
+import os
+import struct
+from typing import Optional, Tuple
+
+import ffmpeg
+
+# kbps, indexed by [version is MPEG1][layer][bitrate index]
+BITRATES = {
+    True: {
+        1: (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+        2: (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+        3: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    },
+    False: {
+        1: (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+        2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+        3: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    },
+}
+SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+def _parse_frame_header(data, pos: int) -> Optional[Tuple[int, int, int, bool, bool]]:
+    """Parses the 4 byte MPEG audio frame header at pos.
+
+    Returns:
+        tuple: (frame length in bytes, samples per frame, sample rate, is MPEG1, is mono),
+            None if there is no valid header at pos
+    """
+    if pos + 4 > len(data) or data[pos] != 0xFF or data[pos + 1] & 0xE0 != 0xE0:
+        return None
+    b1, b2, b3 = data[pos + 1], data[pos + 2], data[pos + 3]
+    version = (b1 >> 3) & 3
+    layer = 4 - ((b1 >> 1) & 3)
+    bitrate_index = b2 >> 4
+    sample_rate_index = (b2 >> 2) & 3
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None  # reserved values, or free format which has no fixed frame length
+
+    mpeg1 = version == 3
+    bitrate = BITRATES[mpeg1][layer][bitrate_index] * 1000
+    sample_rate = SAMPLE_RATES[version][sample_rate_index]
+    padding = (b2 >> 1) & 1
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    elif layer == 2 or mpeg1:
+        samples = 1152
+        length = 144 * bitrate // sample_rate + padding
+    else:
+        samples = 576
+        length = 72 * bitrate // sample_rate + padding
+    return length, samples, sample_rate, mpeg1, (b3 >> 6) == 3
+
+
+def _skip_id3v2(data) -> int:
+    if len(data) >= 10 and data[:3] == b"ID3":
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        footer = 10 if data[5] & 0x10 else 0
+        return 10 + size + footer
+    return 0
+
+
+def _vbr_header_duration(data, pos: int, header) -> Optional[float]:
+    """Duration from the Xing/Info or VBRI header stored in the first frame, if any."""
+    _, samples, sample_rate, mpeg1, mono = header
+    xing = pos + 4 + ((17 if mono else 32) if mpeg1 else (9 if mono else 17))
+    if data[xing:xing + 4] in (b"Xing", b"Info"):
+        flags = struct.unpack(">I", data[xing + 4:xing + 8])[0]
+        if not flags & 1:
+            return None
+        frames = struct.unpack(">I", data[xing + 8:xing + 12])[0]
+        total = frames * samples
+        # LAME tag: encoder delay and padding, trimmed by decoders for gapless playback
+        lame = xing + 8 + 4 * bool(flags & 1) + 4 * bool(flags & 2) + 100 * bool(flags & 4) + 4 * bool(flags & 8)
+        if data[lame:lame + 4] == b"LAME" and lame + 24 <= len(data):
+            delay_padding = data[lame + 21:lame + 24]
+            delay = (delay_padding[0] << 4) | (delay_padding[1] >> 4)
+            padding = ((delay_padding[1] & 0x0F) << 8) | delay_padding[2]
+            total = max(total - delay - padding, 0)
+        return total / sample_rate
+
+    vbri = pos + 4 + 32
+    if data[vbri:vbri + 4] == b"VBRI":
+        frames = struct.unpack(">I", data[vbri + 14:vbri + 18])[0]
+        return frames * samples / sample_rate
+    return None
+
+
+def mp3_duration(path: str) -> Optional[float]:
+    """Exact duration of an mp3 file read from its frame headers, without decoding it.
+
+    Uses the Xing/Info (with the LAME gapless info) or VBRI header when present,
+    otherwise walks the frame headers of the file.
+
+    Returns:
+        float: Duration in seconds, None if the file is not a parseable mp3
+    """
+    if os.path.getsize(path) == 0:
+        return None
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        pos = _skip_id3v2(data)
+        # resync to the first frame whose successor is also a frame
+        header = None
+        while pos + 4 <= len(data):
+            header = _parse_frame_header(data, pos)
+            if header is not None:
+                following = pos + header[0]
+                if following + 4 > len(data) or _parse_frame_header(data, following) is not None:
+                    break
+            pos += 1
+            header = None
+        if header is None:
+            return None
+
+        duration = _vbr_header_duration(data, pos, header)
+        if duration is not None:
+            return duration
+
+        total = 0.0
+        while header is not None:
+            total += header[1] / header[2]
+            pos += header[0]
+            header = _parse_frame_header(data, pos)
+        return total
+
+
+def probe_duration(path: str) -> float:
+    """Duration in seconds of any media file.
+
+    mp3 files are read from their headers, everything else (and mp3 files the
+    parser can't read) goes through ffprobe.
+    """
+    if path.lower().endswith(".mp3"):
+        duration = mp3_duration(path)
+        if duration is not None:
+            return duration
+    return float(ffmpeg.probe(path, cmd="ffprobe")["format"]["duration"])
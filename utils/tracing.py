@@ -0,0 +1,126 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+
+def _rusage() -> Dict[str, float]:
+    """CPU seconds and peak RSS (MB) of this process and of its finished children (ffmpeg)."""
+    if resource is None:
+        return {"cpu": time.process_time(), "children_cpu": 0.0, "peak_rss_mb": 0.0, "children_peak_rss_mb": 0.0}
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {
+        "cpu": own.ru_utime + own.ru_stime,
+        "children_cpu": children.ru_utime + children.ru_stime,
+        "peak_rss_mb": own.ru_maxrss / 1024,
+        "children_peak_rss_mb": children.ru_maxrss / 1024,
+    }
+
+
+def _io() -> Dict[str, int]:
+    """Bytes read and written by this process, including the children it has waited for (linux only)."""
+    try:
+        with open("/proc/self/io") as io_file:
+            counters = dict(line.split(": ") for line in io_file.read().splitlines())
+        return {"read_bytes": int(counters["read_bytes"]), "write_bytes": int(counters["write_bytes"])}
+    except (OSError, KeyError, ValueError):
+        return {"read_bytes": 0, "write_bytes": 0}
+
+
+class Tracer:
+    """Collects spans and counters in the Chrome trace event format.
+
+    The output opens in chrome://tracing or https://ui.perfetto.dev. CPU time,
+    peak RSS and I/O are process wide, so spans running at the same time in
+    other threads show up in each other's numbers.
+    """
+
+    def __init__(self):
+        self._events = []
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    def _now_us(self) -> float:
+        return (time.perf_counter() - self._origin) * 1e6
+
+    @contextmanager
+    def span(self, name: str, cat: str = "stage", **args):
+        usage, io, start = _rusage(), _io(), self._now_us()
+        try:
+            yield
+        finally:
+            end = self._now_us()
+            usage_end, io_end = _rusage(), _io()
+            args.update({
+                "wall_s": round((end - start) / 1e6, 4),
+                "cpu_s": round(usage_end["cpu"] - usage["cpu"], 4),
+                "children_cpu_s": round(usage_end["children_cpu"] - usage["children_cpu"], 4),
+                "peak_rss_mb": round(usage_end["peak_rss_mb"], 1),
+                "children_peak_rss_mb": round(usage_end["children_peak_rss_mb"], 1),
+                "read_bytes": io_end["read_bytes"] - io["read_bytes"],
+                "write_bytes": io_end["write_bytes"] - io["write_bytes"],
+            })
+            self._add({
+                "name": name,
+                "cat": cat,
+                "ph": "X",
+                "ts": start,
+                "dur": end - start,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": args,
+            })
+
+    def counter(self, name: str, **values):
+        self._add({
+            "name": name,
+            "ph": "C",
+            "ts": self._now_us(),
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": values,
+        })
+
+    def _add(self, event: Dict):
+        with self._lock:
+            self._events.append(event)
+
+    def write(self, path: str):
+        with self._lock:
+            events = list(self._events)
+        thread_names = [
+            {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": thread.ident, "args": {"name": thread.name}}
+            for thread in threading.enumerate()
+        ]
+        with open(path, "w") as trace_file:
+            json.dump({"traceEvents": thread_names + events, "displayTimeUnit": "ms"}, trace_file)
+
+    def clear(self):
+        with self._lock:
+            self._events = []
+
+
+tracer = Tracer()
+
+
+def traced(name: str = None, cat: str = "stage"):
+    """Decorator recording every call of the function as a span of the global tracer."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name or func.__name__, cat):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
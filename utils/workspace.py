@@ -0,0 +1,241 @@
+import atexit
+import json
+import os
+import shutil
+import signal
+import socket
+import sys
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from utils import settings
+from utils.console import print_substep
+
+TEMP_ROOT = "assets/temp"
+TMPFS_ROOT = "/dev/shm/shorts-ai-generator"
+OWNER_FILE = ".owner"
+# workspaces without an owner file (older versions, half created ones) are only swept after this long
+ORPHAN_GRACE_SECONDS = 3600
+# share of the tmpfs left free for everything else
+TMPFS_RESERVE = 0.25
+
+_active: Dict[str, "Workspace"] = {}
+_reserved = threading.Condition()
+_reserved_bytes = 0
+
+
+class WorkspaceQuotaExceeded(Exception):
+    def __init__(self, id: str, used: int, quota: int, scope: str):
+        self.id = id
+        self.used = used
+        self.quota = quota
+        self.scope = scope
+        super().__init__(f"{scope} workspace quota exceeded by {id}: {used / 1024**2:.0f}MB > {quota / 1024**2:.0f}MB")
+
+
+def _workspace_settings() -> Dict:
+    return settings.config["settings"].get("workspace", {})
+
+
+def quotas() -> Tuple[int, int]:
+    """(per job, total) quotas in bytes."""
+    workspace = _workspace_settings()
+    return (
+        int(workspace.get("job_quota_mb", 1024)) * 1024**2,
+        int(workspace.get("total_quota_mb", 8192)) * 1024**2,
+    )
+
+
+def directory_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except FileNotFoundError:  # removed while walking
+                pass
+    return total
+
+
+def _remove_tree(path: str) -> int:
+    """Removes path, following it when it is a symlink to a workspace.
+
+    Returns:
+        int: How many files were deleted
+    """
+    removed = 0
+    if os.path.islink(path):
+        target = os.path.realpath(path)
+        os.unlink(path)
+        if os.path.isdir(target):
+            removed += _remove_tree(target)
+        return removed
+    if os.path.isdir(path):
+        removed = sum(len(files) for _, _, files in os.walk(path))
+        shutil.rmtree(path, ignore_errors=True)
+    return removed
+
+
+def _owner_alive(owner: Dict) -> bool:
+    if owner.get("host") != socket.gethostname():
+        return True  # can't tell, a shared volume
+    try:
+        os.kill(int(owner["pid"]), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # alive, another user
+        return True
+    return True
+
+
+class Workspace:
+    """Scratch directory of one short, assets/temp/{id}.
+
+    With [settings.workspace] tmpfs it lives in /dev/shm when the per-job quota
+    fits there, assets/temp/{id} being a symlink to it, so the intermediates
+    never touch the disk. The owner file records the pid holding it, which
+    lets sweep_orphans remove the workspaces of crashed processes.
+
+    Args:
+        id (str): Id of the short
+    """
+
+    def __init__(self, id: str):
+        self.id = id
+        self.path = f"{TEMP_ROOT}/{id}"
+        self.job_quota, self.total_quota = quotas()
+        self.reserved = False
+
+    def create(self, timeout: Optional[float] = None) -> "Workspace":
+        """Reserves the per-job quota, waiting while the total quota is taken by
+        other jobs of this process, and creates the directory.
+        """
+        global _reserved_bytes
+        with _reserved:
+            # a single job bigger than the total quota still runs, alone
+            if not _reserved.wait_for(
+                lambda: _reserved_bytes == 0 or _reserved_bytes + self.job_quota <= self.total_quota, timeout
+            ):
+                raise WorkspaceQuotaExceeded(self.id, _reserved_bytes + self.job_quota, self.total_quota, "total")
+            _reserved_bytes += self.job_quota
+            self.reserved = True
+
+        os.makedirs(TEMP_ROOT, exist_ok=True)
+        if not os.path.exists(self.path):
+            target = self._tmpfs_target()
+            if target is not None:
+                os.makedirs(target, exist_ok=True)
+                os.symlink(os.path.abspath(target), self.path)
+            else:
+                os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, OWNER_FILE), "w") as owner_file:
+            json.dump({"pid": os.getpid(), "host": socket.gethostname(), "created": time.time()}, owner_file)
+        _active[self.id] = self
+        return self
+
+    def _tmpfs_target(self) -> Optional[str]:
+        if not _workspace_settings().get("tmpfs", False) or not os.path.isdir(os.path.dirname(TMPFS_ROOT)):
+            return None
+        os.makedirs(TMPFS_ROOT, exist_ok=True)
+        usage = shutil.disk_usage(TMPFS_ROOT)
+        if usage.free - self.job_quota < usage.total * TMPFS_RESERVE:
+            return None
+        return f"{TMPFS_ROOT}/{self.id}"
+
+    @property
+    def on_tmpfs(self) -> bool:
+        return os.path.islink(self.path)
+
+    def usage(self) -> int:
+        return directory_size(os.path.realpath(self.path))
+
+    def check(self):
+        """Raises WorkspaceQuotaExceeded when the job or all the workspaces together use too much."""
+        used = self.usage()
+        if used > self.job_quota:
+            raise WorkspaceQuotaExceeded(self.id, used, self.job_quota, "job")
+        total = sum(directory_size(os.path.realpath(f"{TEMP_ROOT}/{entry}")) for entry in os.listdir(TEMP_ROOT))
+        if total > self.total_quota:
+            raise WorkspaceQuotaExceeded(self.id, total, self.total_quota, "total")
+
+    def remove(self) -> int:
+        """Deletes the workspace and releases its quota.
+
+        Returns:
+            int: How many files were deleted
+        """
+        global _reserved_bytes
+        removed = _remove_tree(self.path)
+        _active.pop(self.id, None)
+        if self.reserved:
+            with _reserved:
+                _reserved_bytes -= self.job_quota
+                self.reserved = False
+                _reserved.notify_all()
+        return removed
+
+    def __enter__(self) -> "Workspace":
+        return self.create()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.remove()
+
+
+def remove_workspace(id: str) -> int:
+    """Removes the workspace of id, whether this process created it or not."""
+    return (_active.get(id) or Workspace(id)).remove()
+
+
+def remove_all():
+    for workspace in list(_active.values()):
+        workspace.remove()
+
+
+def sweep_orphans() -> int:
+    """Removes the workspaces whose owner process is gone, and old ones without an owner.
+
+    Returns:
+        int: How many workspaces were removed
+    """
+    removed = 0
+    for root in (TEMP_ROOT, TMPFS_ROOT):
+        if not os.path.isdir(root):
+            continue
+        for entry in os.listdir(root):
+            path = f"{root}/{entry}"
+            if entry in _active or (root == TMPFS_ROOT and os.path.islink(f"{TEMP_ROOT}/{entry}")):
+                continue  # the symlink in assets/temp is checked instead
+            if os.path.islink(path) and not os.path.exists(path):
+                os.unlink(path)  # its tmpfs target is gone, e.g. after a reboot
+                removed += 1
+                continue
+            if not os.path.isdir(path):
+                continue
+            try:
+                with open(os.path.join(path, OWNER_FILE)) as owner_file:
+                    orphan = not _owner_alive(json.load(owner_file))
+            except (OSError, ValueError, KeyError):
+                orphan = time.time() - os.lstat(path).st_mtime > ORPHAN_GRACE_SECONDS
+            if orphan:
+                _remove_tree(path)
+                removed += 1
+    if removed:
+        print_substep(f"Removed {removed} workspaces left by crashed runs 🗑")
+    return removed
+
+
+def install_cleanup_handlers():
+    """Removes the active workspaces at exit, including exits caused by SIGTERM and SIGHUP.
+
+    Must be called from the main thread. SIGINT already exits through KeyboardInterrupt.
+    """
+
+    def on_signal(signum, frame):
+        remove_all()
+        sys.exit(128 + signum)
+
+    atexit.register(remove_all)
+    for name in ("SIGTERM", "SIGHUP"):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), on_signal)
@@ -0,0 +1,119 @@
+from typing import IO, Optional
+
+import ffmpeg
+import numpy as np
+
+from utils import settings
+from utils.tracing import traced
+from video.background_pcm import CHANNELS, PCM_FORMAT, SAMPLE_RATE, open_pcm, segment
+from video.video_background import read_background_cut
+
+WHISPER_SAMPLE_RATE = 16000
+FEED_BLOCK_SAMPLES = SAMPLE_RATE  # one second per write
+
+
+def use_audio_bus() -> bool:
+    return settings.config["settings"].get("audio_bus", False)
+
+
+def decode(*paths: str) -> np.ndarray:
+    """Decodes audio files, concatenated gaplessly by one ffmpeg process, into (samples, channels) float32."""
+    inputs = [ffmpeg.input(path).audio for path in paths]
+    stream = inputs[0] if len(inputs) == 1 else ffmpeg.concat(*inputs, a=1, v=0)
+    out, _ = stream.output("pipe:", f=PCM_FORMAT, ar=SAMPLE_RATE, ac=CHANNELS).run(capture_stdout=True, quiet=True)
+    return np.frombuffer(out, dtype=np.float32).reshape(-1, CHANNELS)
+
+
+def lowpass(samples: np.ndarray, cutoff: float, sample_rate: int, taps: int = 63) -> np.ndarray:
+    """Windowed-sinc FIR low-pass of mono samples."""
+    n = np.arange(taps) - (taps - 1) / 2
+    kernel = np.sinc(2 * cutoff / sample_rate * n) * np.hamming(taps)
+    kernel /= kernel.sum()
+    return np.convolve(samples, kernel.astype(np.float32), mode="same")
+
+
+def resample(samples: np.ndarray, source_rate: int, target_rate: int) -> np.ndarray:
+    """Resamples mono samples by linear interpolation, low-passed first when downsampling."""
+    if source_rate == target_rate:
+        return samples
+    if target_rate < source_rate:
+        samples = lowpass(samples, 0.45 * target_rate, source_rate)
+    duration = len(samples) / source_rate
+    positions = np.arange(int(duration * target_rate)) * (source_rate / target_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+class AudioBus:
+    """The audio of a short as float32 PCM in memory.
+
+    The TTS chunks are decoded once, the background is read from its segment of
+    the PCM cache and mixed in with NumPy. The mix is piped to the encoder as
+    raw PCM and a 16kHz mono copy goes to whisper, so no intermediate audio
+    file is encoded.
+
+    Args:
+        id (str): Id of the short
+        number_of_clips (int): Number of TTS chunks in assets/temp/{id}/mp3
+    """
+
+    def __init__(self, id: str, number_of_clips: int):
+        self.id = id
+        self.number_of_clips = number_of_clips
+        self._voice: Optional[np.ndarray] = None
+        self._mix: Optional[np.ndarray] = None
+
+    def load(self) -> "AudioBus":
+        """Decodes the TTS chunks, once."""
+        if self._voice is None:
+            self._voice = decode(
+                *(f"assets/temp/{self.id}/mp3/output_chunk_{i + 1}.mp3" for i in range(self.number_of_clips))
+            )
+        return self
+
+    @property
+    def voice(self) -> np.ndarray:
+        return self.load()._voice
+
+    @property
+    def duration(self) -> float:
+        return len(self.voice) / SAMPLE_RATE
+
+    def background(self, length: int) -> np.ndarray:
+        """length samples of the background audio, zero padded."""
+        audio_cut = read_background_cut(self.id).get("audio")
+        if audio_cut is not None:
+            background = segment(open_pcm(audio_cut["pcm"]), audio_cut["start"], audio_cut["duration"])
+        else:
+            background = decode(f"assets/temp/{self.id}/background.mp3")
+        background = background[:length]
+        if len(background) < length:
+            background = np.concatenate([background, np.zeros((length - len(background), CHANNELS), np.float32)])
+        return background
+
+    @traced("audio_bus_mix")
+    def mix(self) -> np.ndarray:
+        """The voice with the background audio mixed in at background_audio_volume."""
+        if self._mix is None:
+            background_audio_volume = settings.config["settings"]["background"]["background_audio_volume"]
+            if background_audio_volume == 0:
+                self._mix = self.voice
+            else:
+                background = self.background(len(self.voice))
+                # amix of two inputs halves both, keep the loudness the ffmpeg mix had
+                self._mix = np.clip((self.voice + background * background_audio_volume) * 0.5, -1, 1)
+        return self._mix
+
+    @traced("audio_bus_transcription")
+    def for_transcription(self) -> np.ndarray:
+        """Mono 16kHz float32 voice, the input format of whisper."""
+        return resample(self.voice.mean(axis=1), SAMPLE_RATE, WHISPER_SAMPLE_RATE)
+
+    def input(self):
+        """ffmpeg input reading the mix from stdin, see feed."""
+        return ffmpeg.input("pipe:", f=PCM_FORMAT, ar=SAMPLE_RATE, ac=CHANNELS)
+
+    def feed(self, stdin: IO[bytes]):
+        """Writes the mix to the stdin of the encoder, for ProgressFfmpeg.execute."""
+        mix = self.mix()
+        for start in range(0, len(mix), FEED_BLOCK_SAMPLES):
+            stdin.write(np.ascontiguousarray(mix[start:start + FEED_BLOCK_SAMPLES]).tobytes())
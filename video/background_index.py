@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import subprocess
+import threading
+from typing import Dict, List
+
+import ffmpeg
+
+INDEX_PATH = "./config/background_index.json"
+CHECKSUM_SAMPLE = 4 * 1024**2
+
+_lock = threading.Lock()
+
+
+def _load_index() -> Dict[str, Dict]:
+    try:
+        with open(INDEX_PATH, encoding="utf-8") as index_file:
+            return json.load(index_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _save_entry(path: str, entry: Dict):
+    # re-read before writing, another process may have indexed other assets meanwhile
+    index = _load_index()
+    index[path] = entry
+    tmp_path = f"{INDEX_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as index_file:
+        json.dump(index, index_file, indent=4)
+    os.replace(tmp_path, INDEX_PATH)
+
+
+def quick_checksum(path: str) -> str:
+    """sha256 of the size, the first and the last 4MB of the file.
+
+    Hashing a multi-GB background in full would cost more than indexing it.
+    """
+    size = os.path.getsize(path)
+    digest = hashlib.sha256(str(size).encode())
+    with open(path, "rb") as f:
+        digest.update(f.read(CHECKSUM_SAMPLE))
+        if size > CHECKSUM_SAMPLE:
+            f.seek(max(size - CHECKSUM_SAMPLE, CHECKSUM_SAMPLE))
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def probe_keyframes(path: str) -> List[float]:
+    """Timestamps of the keyframes of the first video stream, read from the packet flags without decoding."""
+    output = subprocess.run(
+        [
+            "ffprobe", "-v", "error", "-select_streams", "v:0",
+            "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", path,
+        ],
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    ).stdout
+    keyframes = []
+    for line in output.splitlines():
+        pts_time, _, flags = line.partition(",")
+        if "K" in flags and pts_time not in ("", "N/A"):
+            # as printed, rounding could move a keyframe past its real pts
+            keyframes.append(float(pts_time))
+    return sorted(keyframes)
+
+
+def _fps(rate: str) -> float:
+    num, _, den = rate.partition("/")
+    return float(num) / float(den or 1) if float(den or 1) else 0.0
+
+
+def build_entry(path: str) -> Dict:
+    """Probes the file at path into an index entry."""
+    stat = os.stat(path)
+    probe = ffmpeg.probe(path, cmd="ffprobe")
+    entry = {
+        "size": stat.st_size,
+        "mtime": stat.st_mtime_ns,
+        "checksum": quick_checksum(path),
+        "duration": float(probe["format"]["duration"]),
+    }
+    video = next((s for s in probe["streams"] if s["codec_type"] == "video"), None)
+    audio = next((s for s in probe["streams"] if s["codec_type"] == "audio"), None)
+    if video is not None:
+        entry["video"] = {
+            "codec": video["codec_name"],
+            "width": int(video["width"]),
+            "height": int(video["height"]),
+            "fps": _fps(video.get("avg_frame_rate") or video["r_frame_rate"]),
+        }
+        entry["keyframes"] = probe_keyframes(path)
+    if audio is not None:
+        entry["audio"] = {
+            "codec": audio["codec_name"],
+            "sample_rate": int(audio["sample_rate"]),
+            "channels": int(audio["channels"]),
+        }
+    return entry
+
+
+def get_media_info(path: str) -> Dict:
+    """Index entry of the asset at path: duration, size, mtime, checksum, the
+    video/audio stream details and the keyframe timestamps.
+
+    The entry is built on first use and rebuilt whenever the size or the
+    modification time of the file changes.
+    """
+    path = os.path.normpath(path)
+    stat = os.stat(path)
+    with _lock:
+        entry = _load_index().get(path)
+        if entry is None or entry["size"] != stat.st_size or entry["mtime"] != stat.st_mtime_ns:
+            entry = build_entry(path)
+            _save_entry(path, entry)
+    return entry
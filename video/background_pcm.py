@@ -0,0 +1,92 @@
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict
+
+import ffmpeg
+import numpy as np
+
+from utils.console import print_substep
+
+SAMPLE_RATE = 44100
+CHANNELS = 2
+PCM_FORMAT = "f32le"  # matches np.float32
+
+# one lock per cached file, the background stage of several jobs may pick the same audio
+_build_locks: Dict[str, threading.Lock] = {}
+_build_locks_lock = threading.Lock()
+
+
+def pcm_path(audio_choice: str) -> str:
+    return f"assets/backgrounds/pcm/{audio_choice}.{PCM_FORMAT}"
+
+
+def _build_lock(target: str) -> threading.Lock:
+    with _build_locks_lock:
+        return _build_locks.setdefault(target, threading.Lock())
+
+
+def build_pcm(audio_choice: str) -> str:
+    """Decodes a downloaded background audio once into raw interleaved float32 PCM.
+
+    Concurrent calls for the same audio decode it once, the others wait for it.
+    The PCM is written to a unique temporary file and renamed into place, a
+    truncated file would be memory-mapped without any error.
+
+    Returns:
+        str: Path of the raw PCM file
+    """
+    target = pcm_path(audio_choice)
+    if Path(target).is_file():
+        return target
+    with _build_lock(target):
+        if Path(target).is_file():  # decoded while waiting for the lock
+            return target
+        return _build_pcm(audio_choice, target)
+
+
+def _build_pcm(audio_choice: str, target: str) -> str:
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    print_substep(f"Decoding {audio_choice} into the PCM cache...")
+    fd, tmp_target = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".part")
+    os.close(fd)
+    try:
+        (
+            ffmpeg.input(f"assets/backgrounds/audio/{audio_choice}")
+            .output(tmp_target, f=PCM_FORMAT, ar=SAMPLE_RATE, ac=CHANNELS)
+            .overwrite_output()
+            .run(quiet=True)
+        )
+    except ffmpeg.Error as e:
+        os.remove(tmp_target)
+        print(e.stderr.decode("utf8"))
+        exit(1)
+    os.replace(tmp_target, target)
+    return target
+
+
+def open_pcm(path: str) -> np.ndarray:
+    """Memory-maps a raw PCM file as a read-only (samples, channels) float32 array.
+
+    The pages are shared through the page cache by every process mapping the same file.
+    """
+    return np.memmap(path, dtype=np.float32, mode="r").reshape(-1, CHANNELS)
+
+
+def pcm_duration(path: str) -> float:
+    return os.path.getsize(path) / (4 * CHANNELS * SAMPLE_RATE)
+
+
+def segment(pcm: np.ndarray, start: float, duration: float) -> np.ndarray:
+    """Zero-copy view of duration seconds of pcm starting at start."""
+    first = int(round(start * SAMPLE_RATE))
+    return pcm[first:first + int(round(duration * SAMPLE_RATE))]
+
+
+def pcm_input(path: str, start: float, duration: float):
+    """ffmpeg input reading duration seconds of the raw PCM file from start.
+
+    Raw PCM seeks to an exact byte offset, so nothing before start is read or decoded.
+    """
+    return ffmpeg.input(path, f=PCM_FORMAT, ar=SAMPLE_RATE, ac=CHANNELS, ss=start, t=duration)
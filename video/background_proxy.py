@@ -0,0 +1,116 @@
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import ffmpeg
+
+from utils import settings
+from utils.console import print_step, print_substep
+from video.background_index import get_media_info
+from video.encode_profiles import encode_args
+
+PROXY_GOP_SECONDS = 1
+
+# one lock per proxy, the background stage of several jobs may pick the same asset
+_build_locks: Dict[str, threading.Lock] = {}
+_build_locks_lock = threading.Lock()
+
+
+def proxy_path(video_choice: str, W: int, H: int) -> str:
+    return f"assets/backgrounds/proxy/{W}x{H}/{video_choice}"
+
+
+def output_sizes() -> List[Tuple[int, int]]:
+    """The configured resolution plus the extra sizes of background_proxy_sizes ("720x1280,1080x1920")."""
+    sizes = [(int(settings.config["settings"]["resolution_w"]), int(settings.config["settings"]["resolution_h"]))]
+    extra = settings.config["settings"]["background"].get("background_proxy_sizes", "")
+    for size in filter(None, (s.strip() for s in extra.split(","))):
+        W, _, H = size.partition("x")
+        if (int(W), int(H)) not in sizes:
+            sizes.append((int(W), int(H)))
+    return sizes
+
+
+def _build_lock(target: str) -> threading.Lock:
+    with _build_locks_lock:
+        return _build_locks.setdefault(target, threading.Lock())
+
+
+def build_proxy(background_config: Tuple, W: int, H: int) -> str:
+    """Transcodes a downloaded background once into a cropped, scaled, fixed-GOP vertical proxy.
+
+    Concurrent calls for the same proxy build it once, the others wait for it.
+    It is encoded into a unique temporary file and renamed into place, so
+    other processes never see a partial proxy.
+
+    Returns:
+        str: Path of the proxy
+    """
+    uri, filename, credit, _ = background_config
+    video_choice = f"{credit}-{filename}"
+    target = proxy_path(video_choice, W, H)
+    if Path(target).is_file():
+        return target
+    with _build_lock(target):
+        if Path(target).is_file():  # built while waiting for the lock
+            return target
+        return _build_proxy(video_choice, target, W, H)
+
+
+def _build_proxy(video_choice: str, target: str, W: int, H: int) -> str:
+    source = f"assets/backgrounds/video/{video_choice}"
+    fps = get_media_info(source)["video"]["fps"] or 30
+    gop = max(int(round(fps * PROXY_GOP_SECONDS)), 1)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+
+    print_substep(f"Building the {W}x{H} proxy of {video_choice}...")
+    fd, tmp_target = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".part.mp4")
+    os.close(fd)
+    try:
+        (
+            ffmpeg.input(source)
+            # centered like prepare_background, the pos field of background_videos.json is
+            # moviepy's vertical position of the clip, not a horizontal crop offset
+            .video.filter("crop", f"ih*({W}/{H})", "ih")
+            .filter("scale", W, H)
+            .filter("setsar", 1)
+            .output(
+                tmp_target,
+                an=None,
+                pix_fmt="yuv420p",
+                # proxies are encoded once and re-encoded by every short, keep them close to lossless
+                **{**encode_args("archive", audio=False), "g": gop, "keyint_min": gop, "sc_threshold": 0},
+            )
+            .overwrite_output()
+            .run(quiet=True)
+        )
+    except ffmpeg.Error as e:
+        os.remove(tmp_target)
+        print(e.stderr.decode("utf8"))
+        exit(1)
+    os.replace(tmp_target, target)
+    get_media_info(target)  # index it right away, the chopper needs its keyframes
+    return target
+
+
+def build_proxies(background_options: dict):
+    """Builds the proxies of every downloaded background for every output size."""
+    print_step("Building the background proxies 🎞️")
+    for name, background_config in background_options["video"].items():
+        uri, filename, credit, _ = background_config
+        if not Path(f"assets/backgrounds/video/{credit}-{filename}").is_file():
+            print_substep(f"Skipping {name}, it hasn't been downloaded yet")
+            continue
+        for W, H in output_sizes():
+            build_proxy(background_config, W, H)
+    print_substep("Background proxies built successfully! 🎉", style="bold green")
+
+
+if __name__ == "__main__":
+    from video.video_background import get_background_options
+
+    directory = Path().absolute()
+    settings.check_toml(f"{directory}/utils/.config.template.toml", f"{directory}/config.toml")
+    build_proxies(get_background_options())
@@ -0,0 +1,212 @@
+"""Named encode settings shared by every ffmpeg/moviepy encode.
+
+    python -m video.encode_profiles autotune --target-ssim 0.97
+
+benchmarks the profiles on a synthetic clip on this machine and records the
+results in config/encode_autotune.json. Setting encode_profile = "auto" then
+picks the fastest profile that met the quality target.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import re
+import subprocess
+import tempfile
+import time
+from typing import Dict, List
+
+from utils import settings
+from utils.cpu_budget import stage_threads
+from utils.console import print_step, print_substep
+
+AUTOTUNE_PATH = "./config/encode_autotune.json"
+
+PROFILES: Dict[str, Dict] = {
+    "draft": {
+        "c:v": "libx264",
+        "preset": "veryfast",
+        "crf": 28,
+        "g": 60,
+        "c:a": "aac",
+        "b:a": "128k",
+    },
+    "publish": {
+        "c:v": "libx264",
+        "preset": "medium",
+        "crf": 20,
+        "g": 60,
+        "c:a": "aac",
+        "b:a": "192k",
+        "movflags": "+faststart",
+    },
+    "archive": {
+        "c:v": "libx264",
+        "preset": "slow",
+        "crf": 16,
+        "tune": "film",
+        "g": 120,
+        "c:a": "aac",
+        "b:a": "256k",
+    },
+    # what every encode used before the profiles existed
+    "legacy": {
+        "c:v": "h264",
+        "b:v": "20M",
+        "b:a": "192k",
+    },
+}
+
+AUDIO_OPTIONS = ("c:a", "b:a")
+
+
+def selected_profile() -> str:
+    """Name of the profile set in encode_profile, resolving "auto" with the autotune results."""
+    name = settings.config["settings"].get("encode_profile", "legacy")
+    if name == "auto":
+        try:
+            with open(AUTOTUNE_PATH) as autotune_file:
+                name = json.load(autotune_file)["best"] or "publish"
+        except (FileNotFoundError, KeyError, json.JSONDecodeError):
+            name = "publish"
+    return name
+
+
+def encode_args(profile: str = None, video: bool = True, audio: bool = True) -> Dict:
+    """ffmpeg-python output options of the profile (the selected one by default).
+
+    Args:
+        profile (str): Profile name, defaults to selected_profile()
+        video (bool): Include the video codec options
+        audio (bool): Include the audio codec options
+    """
+    options = PROFILES[profile or selected_profile()]
+    args = {
+        key: value
+        for key, value in options.items()
+        if (audio if key in AUDIO_OPTIONS else video)
+    }
+    if video:
+        args["threads"] = stage_threads()
+    return args
+
+
+def moviepy_args(profile: str = None) -> Dict:
+    """The profile as VideoClip.write_videofile keyword arguments."""
+    options = PROFILES[profile or selected_profile()]
+    ffmpeg_params = []
+    for key in ("crf", "tune", "g", "movflags"):
+        if key in options:
+            ffmpeg_params += [f"-{key}", str(options[key])]
+    args = {
+        "codec": "libx264" if options["c:v"] == "h264" else options["c:v"],
+        "audio_codec": options.get("c:a", "aac"),
+        "audio_bitrate": options["b:a"],
+        "threads": stage_threads(),
+        "ffmpeg_params": ffmpeg_params,
+    }
+    if "preset" in options:
+        args["preset"] = options["preset"]
+    if "b:v" in options:
+        args["bitrate"] = options["b:v"]
+    return args
+
+
+def _to_cli(options: Dict) -> List[str]:
+    cli = []
+    for key, value in options.items():
+        cli += [f"-{key}", str(value)]
+    return cli
+
+
+def _compare(encoded: str, reference: str, metric: str) -> float:
+    """Runs the ssim or psnr filter and returns its overall score."""
+    stderr = subprocess.run(
+        ["ffmpeg", "-i", encoded, "-i", reference, "-lavfi", metric, "-f", "null", "-"],
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    ).stderr
+    pattern = r"All:([\d.]+)" if metric == "ssim" else r"average:([\d.]+|inf)"
+    return float(re.findall(pattern, stderr)[-1])
+
+
+def autotune(profiles: List[str], W: int, H: int, duration: int = 10, fps: int = 30, target_ssim: float = 0.97) -> Dict:
+    """Encodes a synthetic clip with every profile and records speed, size and quality.
+
+    Returns:
+        Dict: The results, also written to config/encode_autotune.json
+    """
+    print_step(f"Benchmarking encode profiles on a {duration}s {W}x{H} clip ⏱️")
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        reference = os.path.join(tmp, "reference.mkv")
+        subprocess.run(
+            [
+                "ffmpeg", "-y", "-f", "lavfi", "-i", f"testsrc2=size={W}x{H}:rate={fps}:duration={duration}",
+                "-c:v", "libx264", "-qp", "0", "-preset", "ultrafast", reference,
+            ],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        for name in profiles:
+            encoded = os.path.join(tmp, f"{name}.mp4")
+            options = encode_args(name, audio=False)
+            start = time.perf_counter()
+            subprocess.run(
+                ["ffmpeg", "-y", "-i", reference, "-an", *_to_cli(options), encoded],
+                check=True,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            elapsed = time.perf_counter() - start
+            result = {
+                "profile": name,
+                "encode_fps": round(duration * fps / elapsed, 2),
+                "size_bytes": os.path.getsize(encoded),
+                "ssim": _compare(encoded, reference, "ssim"),
+                "psnr": _compare(encoded, reference, "psnr"),
+            }
+            results.append(result)
+            print_substep(
+                f"{name}: {result['encode_fps']} fps, {result['size_bytes'] / 1024**2:.1f} MB, "
+                f"SSIM {result['ssim']:.4f}, PSNR {result['psnr']:.2f}dB"
+            )
+
+    passing = [r for r in results if r["ssim"] >= target_ssim]
+    best = max(passing, key=lambda r: r["encode_fps"])["profile"] if passing else None
+    report = {
+        "machine": {
+            "node": platform.node(),
+            "processor": platform.processor(),
+            "cpu_count": multiprocessing.cpu_count(),
+        },
+        "clip": {"width": W, "height": H, "duration": duration, "fps": fps},
+        "target_ssim": target_ssim,
+        "results": results,
+        "best": best,
+    }
+    with open(AUTOTUNE_PATH, "w") as autotune_file:
+        json.dump(report, autotune_file, indent=4)
+    if best is None:
+        print_substep(f"No profile reached SSIM {target_ssim}", style="bold red")
+    else:
+        print_substep(f"Fastest profile reaching SSIM {target_ssim}: {best}", style="bold green")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Encode profiles")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    autotune_parser = subparsers.add_parser("autotune", help="Benchmark the profiles on this machine")
+    autotune_parser.add_argument("--profiles", nargs="*", default=["draft", "publish", "archive"])
+    autotune_parser.add_argument("--width", type=int, default=1080)
+    autotune_parser.add_argument("--height", type=int, default=1920)
+    autotune_parser.add_argument("--duration", type=int, default=10)
+    autotune_parser.add_argument("--target-ssim", type=float, default=0.97)
+    args = parser.parse_args()
+
+    autotune(args.profiles, args.width, args.height, args.duration, target_ssim=args.target_ssim)
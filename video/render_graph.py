@@ -0,0 +1,172 @@
+from typing import Dict, List, Optional
+
+import ffmpeg
+from tqdm import tqdm
+
+from text.ass_captions import write_ass, write_ass_from_settings
+from utils import settings
+from utils.console import print_step, print_substep
+from utils.cpu_budget import budget
+from utils.tracing import traced
+from video.audio_bus import AudioBus
+from video.encode_profiles import encode_args
+from video.video_background import background_audio_input, read_background_cut
+
+
+class RenderError(Exception):
+    """The final encode failed, the caller decides whether to exit."""
+
+
+def caption_overlay(video, word_timings: List[Dict], ass_path: str, W: int, H: int, fontsize: int = 50):
+    """Draws every word of the transcription on top of the video stream, so the
+    captions are burnt in during the same encode.
+
+    The words are written as an ASS track rendered by a single ass filter:
+    one drawtext per word made the filter chain, and the per-frame work, grow
+    with the length of the script. The style matches the moviepy captions,
+    one white word at a time centered on the frame.
+
+    Args:
+        video: ffmpeg video stream the captions are drawn on
+        word_timings (List[Dict]): [{'word', 'start', 'end'}] as returned by transcribe_audio
+        ass_path (str): Where the ASS track is written
+        W (int): Width of the video
+        H (int): Height of the video
+        fontsize (int): Font size of the captions
+
+    Returns:
+        The video stream with the ass filter applied
+    """
+    write_ass(word_timings, ass_path, W, H, fontsize=fontsize, words_per_phrase=1, highlight_color="255,255,255")
+    return video.filter("ass", ass_path)
+
+
+def build_render_graph(
+    id: str,
+    number_of_clips: int,
+    length: float,
+    W: int,
+    H: int,
+    output_path: str,
+    word_timings: Optional[List[Dict]] = None,
+    bus: Optional[AudioBus] = None,
+):
+    """Builds a single ffmpeg filter graph that crops/scales the background, concatenates
+    the TTS chunks, mixes the background audio and overlays the captions.
+
+    Video and audio are encoded exactly once, straight into the output file.
+
+    Args:
+        id (str): Identifier of the short, used to locate assets/temp/{id}
+        number_of_clips (int): Number of TTS chunks in assets/temp/{id}/mp3
+        length (float): Length of the final video in seconds
+        W (int): Output width
+        H (int): Output height
+        output_path (str): Path of the resulting mp4
+        word_timings (List[Dict], optional): Word timings used to draw the captions
+        bus (AudioBus, optional): Audio already mixed in memory, read from stdin instead
+
+    Returns:
+        ffmpeg output node, ready to be run
+    """
+    video = (
+        ffmpeg.input(f"assets/temp/{id}/background.mp4")
+        .video.filter("trim", duration=length)
+        .filter("setpts", "PTS-STARTPTS")
+    )
+    if not read_background_cut(id).get("video", {}).get("proxy"):
+        video = video.filter("crop", f"ih*({W}/{H})", "ih").filter("scale", W, H).filter("setsar", 1)
+    if word_timings:
+        if settings.config["settings"].get("captions", {}).get("backend", "moviepy") == "ass":
+            ass_path = write_ass_from_settings(word_timings, f"assets/temp/{id}/captions.ass", W, H)
+            video = video.filter("ass", ass_path)
+        else:
+            video = caption_overlay(video, word_timings, f"assets/temp/{id}/captions.ass", W, H)
+
+    if bus is not None:
+        return ffmpeg.output(
+            bus.input().audio, video, output_path, f="mp4", t=length, **encode_args()
+        ).overwrite_output()
+
+    audio_clips = [
+        ffmpeg.input(f"assets/temp/{id}/mp3/output_chunk_{i + 1}.mp3").audio
+        for i in range(number_of_clips)
+    ]
+    audio = ffmpeg.concat(*audio_clips, a=1, v=0)
+
+    background_audio_volume = settings.config["settings"]["background"]["background_audio_volume"]
+    if background_audio_volume != 0:
+        bg_audio = background_audio_input(id).audio.filter(
+            "volume",
+            background_audio_volume,
+        )
+        audio = ffmpeg.filter([audio, bg_audio], "amix", duration="longest")
+
+    return ffmpeg.output(
+        audio,
+        video,
+        output_path,
+        f="mp4",
+        t=length,
+        **encode_args(),
+    ).overwrite_output()
+
+
+@traced()
+def write_transcription_audio(id: str, number_of_clips: int) -> str:
+    """Concatenates the TTS chunks into a lossless wav used as the transcription input.
+
+    Returns:
+        str: Path of the written wav
+    """
+    audio_path = f"assets/temp/{id}/audio.wav"
+    audio_clips = [
+        ffmpeg.input(f"assets/temp/{id}/mp3/output_chunk_{i + 1}.mp3").audio
+        for i in range(number_of_clips)
+    ]
+    ffmpeg.output(
+        ffmpeg.concat(*audio_clips, a=1, v=0), audio_path, **{"c:a": "pcm_s16le"}
+    ).overwrite_output().run(quiet=True)
+    return audio_path
+
+
+@traced()
+def render_single_pass(
+    id: str,
+    number_of_clips: int,
+    length: float,
+    W: int,
+    H: int,
+    output_path: str,
+    word_timings: Optional[List[Dict]] = None,
+    bus: Optional[AudioBus] = None,
+):
+    """Runs the graph built by build_render_graph while reporting the progress.
+
+    Raises:
+        RenderError: When ffmpeg fails, with its stderr as the message
+    """
+    # imported here, video_creator imports this module
+    from video.video_creator import ProgressFfmpeg
+
+    print_step("Rendering the final video in a single pass 🎥")
+    pbar = tqdm(total=100, desc="Progress: ", bar_format="{l_bar}{bar}", unit=" %")
+
+    def on_update(progress) -> None:
+        status = round(progress * 100, 2)
+        pbar.update(status - pbar.n)
+
+    try:
+        with budget.stage("encode"):
+            output = build_render_graph(id, number_of_clips, length, W, H, output_path, word_timings, bus)
+            ProgressFfmpeg(length, on_update, name="render_single_pass").execute(
+                output, feed=bus.feed if bus is not None else None
+            )
+    except ffmpeg.Error as e:
+        pbar.close()
+        raise RenderError(e.stderr.decode("utf8")) from e
+
+    pbar.update(100 - pbar.n)
+    pbar.close()
+    print_substep(f"Video rendered to {output_path}", style="bold green")
+    return output_path
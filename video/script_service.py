@@ -0,0 +1,207 @@
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+from utils import settings
+
+SYSTEM_PROMPT = """
+                    You are a youtube short content creator.
+                    Your role is to simply return the text to be said in the short.
+                    Remember that the first attraction is imperative, so make the
+                    first sentece of the short appealing to the viewer. The content
+                    must cover at least 45 seconds but NO MORE than 1 minute. Text MUST be
+                    clean, no emojis. And make it concise the text to be said, we dont want to have
+                    a long short.
+                """
+
+
+class RateLimiter:
+    """Token buckets for the requests and tokens per minute of the API."""
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.capacity = {"requests": requests_per_minute, "tokens": tokens_per_minute}
+        self.available = dict(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        for name, capacity in self.capacity.items():
+            self.available[name] = min(capacity, self.available[name] + capacity * (now - self.updated) / 60)
+        self.updated = now
+
+    async def acquire(self, tokens: int):
+        """Waits until a request of tokens tokens fits in the budget, callers are served in order."""
+        tokens = min(tokens, self.capacity["tokens"])
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.available["requests"] >= 1 and self.available["tokens"] >= tokens:
+                    self.available["requests"] -= 1
+                    self.available["tokens"] -= tokens
+                    return
+                wait = max(
+                    (1 - self.available["requests"]) * 60 / self.capacity["requests"],
+                    (tokens - self.available["tokens"]) * 60 / self.capacity["tokens"],
+                    0.01,
+                )
+                await asyncio.sleep(wait)
+
+    def settle(self, estimated: int, used: int):
+        """Gives back the tokens that were reserved but not used."""
+        self._refill()
+        self.available["tokens"] = min(self.capacity["tokens"], self.available["tokens"] + estimated - used)
+
+
+class ScriptCache:
+    """Responses on disk in {root}/{key[:2]}/{key}.json."""
+
+    def __init__(self, root: str = "assets/cache/scripts"):
+        self.root = root
+
+    @staticmethod
+    def key(model: str, system: str, question: str, params: Dict) -> str:
+        payload = json.dumps([model, system, question, params], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            with open(self._path(key), encoding="utf-8") as cache_file:
+                return json.load(cache_file)["answer"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, key: str, answer: str):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # written under a temporary name, readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as tmp_file:
+            json.dump({"answer": answer, "created": time.time()}, tmp_file, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+class ScriptService:
+    """Generates scripts concurrently with one pooled AsyncOpenAI client.
+
+    Requests run at most max_concurrency at a time within the requests and
+    tokens per minute budget. Answers are cached on disk, and identical
+    prompts in flight at the same time share a single request.
+
+    The service owns an event loop in a background thread, so synchronous
+    callers from any thread (ask_sync) share the client, the budget and the
+    in-flight requests.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        model: str = "gpt-4o",
+        max_tokens: int = 150,
+        requests_per_minute: int = 60,
+        tokens_per_minute: int = 30000,
+        max_concurrency: int = 8,
+        cache: Optional[ScriptCache] = None,
+    ):
+        self.model = model
+        self.max_tokens = max_tokens
+        self.cache = cache
+        self.requests = 0
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="ScriptService", daemon=True)
+        self._thread.start()
+
+        async def setup():
+            from openai import AsyncOpenAI
+
+            # bound to the service loop, like every asyncio object used by the requests
+            self.client = AsyncOpenAI(api_key=api_key, base_url=base_url or None)
+            self.limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+            self._semaphore = asyncio.Semaphore(max_concurrency)
+
+        asyncio.run_coroutine_threadsafe(setup(), self._loop).result()
+
+    async def ask(self, question: str, system: str = SYSTEM_PROMPT, **params) -> str:
+        """Answer of the model to question, from the cache or a request shared with identical prompts.
+
+        Can be awaited from any event loop, the request runs on the service loop.
+        """
+        return await asyncio.wrap_future(
+            asyncio.run_coroutine_threadsafe(self._ask(question, system, **params), self._loop)
+        )
+
+    async def ask_many(self, questions: List[str], **params) -> List[str]:
+        return list(await asyncio.gather(*(self.ask(question, **params) for question in questions)))
+
+    def ask_sync(self, question: str, system: str = SYSTEM_PROMPT, **params) -> str:
+        """ask from synchronous code, blocks the calling thread only."""
+        return asyncio.run_coroutine_threadsafe(self._ask(question, system, **params), self._loop).result()
+
+    async def _ask(self, question: str, system: str, **params) -> str:
+        params = {"max_tokens": self.max_tokens, **params}
+        key = ScriptCache.key(self.model, system, question, params)
+        if self.cache is not None:
+            answer = self.cache.get(key)
+            if answer is not None:
+                return answer
+
+        if key not in self._in_flight:
+            self._in_flight[key] = asyncio.ensure_future(self._request(key, question, system, params))
+            self._in_flight[key].add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # shielded, a cancelled caller must not cancel the request of the others
+        return await asyncio.shield(self._in_flight[key])
+
+    async def _request(self, key: str, question: str, system: str, params: Dict) -> str:
+        # ~4 characters per token, plus the completion
+        estimated = (len(system) + len(question)) // 4 + params["max_tokens"]
+        async with self._semaphore:
+            await self.limiter.acquire(estimated)
+            self.requests += 1
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": system},
+                    {"role": "user", "content": question},
+                ],
+                **params,
+            )
+        if response.usage is not None:
+            self.limiter.settle(estimated, response.usage.total_tokens)
+        answer = response.choices[0].message.content
+        if self.cache is not None:
+            self.cache.put(key, answer)
+        return answer
+
+
+_service: Optional[ScriptService] = None
+_service_lock = threading.Lock()
+
+
+def get_script_service() -> ScriptService:
+    """The service configured in [settings.openai], created on first use."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            openai_settings = settings.config["settings"].get("openai", {})
+            _service = ScriptService(
+                api_key=openai_settings.get("api_key", None) or None,
+                base_url=openai_settings.get("base_url", None),
+                model=openai_settings.get("model", "gpt-4o"),
+                max_tokens=int(openai_settings.get("max_tokens", 150)),
+                requests_per_minute=int(openai_settings.get("requests_per_minute", 60)),
+                tokens_per_minute=int(openai_settings.get("tokens_per_minute", 30000)),
+                max_concurrency=int(openai_settings.get("max_concurrency", 8)),
+                cache=ScriptCache() if openai_settings.get("cache_enabled", True) else None,
+            )
+        return _service
@@ -0,0 +1,155 @@
+from typing import IO, Dict, Final, List, Optional, Tuple
+
+import ffmpeg
+from tqdm import tqdm
+
+from utils import settings
+from utils.console import print_step, print_substep
+from utils.cpu_budget import budget
+from utils.tracing import traced, tracer
+from utils.workspace import Workspace
+from video.audio_bus import decode
+from video.background_pcm import CHANNELS, PCM_FORMAT, SAMPLE_RATE
+from video.encode_profiles import encode_args
+from video.render_graph import RenderError
+from video.video_background import background_audio_input, chop_background, read_background_cut
+from video.video_creator import (
+    ProgressFfmpeg,
+    caption_video,
+    remove_temporary_files,
+    result_path,
+    transcribe_job,
+)
+from voices.base import TTSChunkError
+from voices.voice_generator import TTSProviders
+
+# conservative speaking rate, the background is cut for the estimated length
+# and frozen on its last frame if the speech turns out to be longer
+ESTIMATE_CHARS_PER_SECOND = 12
+ESTIMATE_MARGIN = 1.15
+
+
+class StreamingRenderError(RenderError):
+    """The voice or the encode of a streaming render failed, the caller decides whether to exit."""
+
+
+def estimate_duration(text: str) -> float:
+    """Upper estimate of the length of the speech of text, in seconds."""
+    return round(len(text) / ESTIMATE_CHARS_PER_SECOND * ESTIMATE_MARGIN, 1) + 2
+
+
+def build_streaming_graph(id: str, W: int, H: int, output_path: str, max_length: float):
+    """Encoder of the short whose speech is read from stdin as raw PCM.
+
+    The output ends with the speech: the background video is padded with its
+    last frame up to max_length and cut with -shortest, and the background
+    audio stops with amix.
+    """
+    video = ffmpeg.input(f"assets/temp/{id}/background.mp4").video.filter("setpts", "PTS-STARTPTS")
+    if not read_background_cut(id).get("video", {}).get("proxy"):
+        video = video.filter("crop", f"ih*({W}/{H})", "ih").filter("scale", W, H).filter("setsar", 1)
+    video = video.filter("tpad", stop_mode="clone", stop_duration=max_length).filter("trim", duration=max_length)
+
+    audio = ffmpeg.input("pipe:", f=PCM_FORMAT, ar=SAMPLE_RATE, ac=CHANNELS, thread_queue_size=1024).audio
+    background_audio_volume = settings.config["settings"]["background"]["background_audio_volume"]
+    if background_audio_volume != 0:
+        bg_audio = background_audio_input(id).audio.filter("volume", background_audio_volume)
+        audio = ffmpeg.filter([audio, bg_audio], "amix", duration="first")
+
+    return ffmpeg.output(
+        audio,
+        video,
+        output_path,
+        f="mp4",
+        shortest=None,
+        # the video runs ahead of the speech while the TTS is still synthesizing
+        max_muxing_queue_size=4096,
+        **encode_args(),
+    ).overwrite_output()
+
+
+@traced()
+def render_streaming(obj, bg_config: Dict[str, Tuple], path: str) -> Tuple[str, float, int]:
+    """Synthesizes the speech and renders the short at the same time.
+
+    The background is chopped for the estimated length of the speech, then
+    ffmpeg starts encoding as soon as the first TTS chunk is written, with the
+    chunks piped in order as they finish.
+
+    Returns:
+        [str, float, int]: Path of the video without captions, length of the speech and number of chunks
+    """
+    W: Final[int] = int(settings.config["settings"]["resolution_w"])
+    H: Final[int] = int(settings.config["settings"]["resolution_h"])
+    id = obj["id"]
+
+    estimated_length = estimate_duration(obj["text"])
+    chop_background(bg_config, estimated_length, obj)
+
+    voice = str(settings.config["settings"]["tts"]["voice_choice"]).casefold()
+    engine = TTSProviders[voice](identifier=id)
+    chunks = engine.stream(obj["text"], engine.default_voice())
+    try:
+        first_chunk = next(chunks, None)
+    except TTSChunkError as e:
+        raise StreamingRenderError(str(e)) from e
+    if first_chunk is None:
+        raise StreamingRenderError("No TTS chunk could be synthesized")
+
+    print_step("Rendering the final video while the voice is synthesized 🎥")
+    print_substep(f"Video Will Be: ~{estimated_length:.0f} Seconds Long")
+    video_path = result_path(path, "final_video")
+    pbar = tqdm(total=100, desc="Progress: ", bar_format="{l_bar}{bar}", unit=" %")
+
+    def on_update(progress) -> None:
+        status = min(round(progress * 100, 2), 100)
+        pbar.update(status - pbar.n)
+
+    written: List[Dict] = []
+
+    def feed(stdin: IO[bytes]):
+        for chunk in [first_chunk, *chunks]:
+            with tracer.span("stream_chunk", cat="render", index=chunk["index"]):
+                stdin.write(decode(chunk["path"]).tobytes())
+            written.append(chunk)
+
+    try:
+        with budget.stage("encode"):
+            ProgressFfmpeg(estimated_length, on_update, name="render_streaming").execute(
+                build_streaming_graph(id, W, H, video_path, max_length=2 * estimated_length), feed=feed
+            )
+    except ffmpeg.Error as e:
+        pbar.close()
+        raise StreamingRenderError(e.stderr.decode("utf8")) from e
+    except TTSChunkError as e:  # raised by feed, ffmpeg got the speech up to that chunk only
+        pbar.close()
+        raise StreamingRenderError(str(e)) from e
+
+    pbar.update(100 - pbar.n)
+    pbar.close()
+    length = sum(chunk["duration"] for chunk in written)
+    print_substep(f"Video rendered to {video_path} ({length:.1f} seconds)", style="bold green")
+    return [video_path, length, engine.chunk_count]
+
+
+@traced()
+def make_streaming_video(obj, bg_config: Dict[str, Tuple], path: str, workspace: Optional[Workspace] = None) -> str:
+    """Same result as save_text_to_mp3, chop_background and make_final_video in a
+    row, but the encode overlaps the TTS. The captions are burnt in afterwards.
+
+    Returns:
+        str: Path of the captioned video, like make_final_video
+
+    Raises:
+        StreamingRenderError: When no speech could be synthesized or the encode failed
+        WorkspaceQuotaExceeded: When the TTS chunks and background cut outgrow the workspace quotas
+    """
+    [video_path, length, number_of_clips] = render_streaming(obj, bg_config, path)
+    if workspace is not None:
+        workspace.check()
+
+    word_timings = transcribe_job(obj, number_of_clips)
+    captions_video_path = caption_video(word_timings, video_path, path)
+
+    remove_temporary_files(obj["id"])
+    return captions_video_path
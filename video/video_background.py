@@ -1,16 +1,24 @@
 import json
 import random
 import re
+from bisect import bisect_right
+from functools import lru_cache
 from pathlib import Path
 from random import randrange
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, List, Tuple
 import os
-import yt_dlp
-from moviepy.editor import AudioFileClip, VideoFileClip
-from moviepy.video.io.ffmpeg_tools import ffmpeg_extract_subclip
+import ffmpeg
 
 from utils import settings
 from utils.console import print_step, print_substep
+from utils.tracing import traced
+from video.background_index import get_media_info
+from video.background_pcm import build_pcm, pcm_duration, pcm_input
+from video.background_proxy import build_proxy
+
+
+# well under a frame, see cut_background_video
+KEYFRAME_EPSILON = 0.001
 
 
 def load_background_options():
@@ -36,6 +44,12 @@ def load_background_options():
     return background_options
 
 
+@lru_cache(maxsize=None)
+def get_background_options() -> Dict:
+    """load_background_options, read on first use instead of at import."""
+    return load_background_options()
+
+
 def get_start_and_end_times(video_length: int, length_of_clip: int) -> Tuple[int, int]:
     """Generates a random interval of time to be used as the background of the video.
 
@@ -57,6 +71,63 @@ def get_start_and_end_times(video_length: int, length_of_clip: int) -> Tuple[int
     return random_time, random_time + video_length
 
 
+def snap_to_keyframe(start: float, keyframes: List[float], latest: float) -> float:
+    """Moves start to the nearest keyframe that is not later than latest.
+
+    Args:
+        start (float): Randomly chosen start time
+        keyframes (List[float]): Sorted keyframe timestamps of the video
+        latest (float): Latest start that still leaves enough footage
+
+    Returns:
+        float: The keyframe timestamp, or start if there is no suitable keyframe
+    """
+    i = bisect_right(keyframes, start)
+    candidates = [k for k in keyframes[max(i - 1, 0):i + 1] if k <= latest]
+    if not candidates:
+        return start
+    return min(candidates, key=lambda k: abs(k - start))
+
+
+def cut_background_video(source: str, start: float, length: float, target: str):
+    """Cuts length seconds of source starting at start without re-encoding.
+
+    start must be a keyframe: with -ss before -i and stream copy, ffmpeg begins
+    at the keyframe at or before start. The seek goes KEYFRAME_EPSILON past it,
+    so a timestamp printed a hair later than the real pts (ffprobe keeps 6
+    decimals) doesn't fall back to the previous keyframe, seconds earlier.
+    """
+    try:
+        (
+            ffmpeg.input(source, ss=start + KEYFRAME_EPSILON)
+            .output(target, t=length, c="copy", an=None, avoid_negative_ts="make_zero")
+            .overwrite_output()
+            .run(quiet=True)
+        )
+    except ffmpeg.Error as e:
+        print(e.stderr.decode("utf8"))
+        exit(1)
+
+
+def read_background_cut(id: str) -> Dict:
+    """The segments chosen by chop_background for the given short, {} if unknown."""
+    try:
+        with open(f"assets/temp/{id}/background.json") as json_file:
+            return json.load(json_file)
+    except FileNotFoundError:
+        return {}
+
+
+def background_audio_input(id: str):
+    """ffmpeg input of the background audio chosen for the given short: its
+    segment of the PCM cache, or assets/temp/{id}/background.mp3.
+    """
+    audio_cut = read_background_cut(id).get("audio")
+    if audio_cut is not None:
+        return pcm_input(audio_cut["pcm"], audio_cut["start"], audio_cut["duration"])
+    return ffmpeg.input(f"assets/temp/{id}/background.mp3")
+
+
 def get_background_config(mode: str):
     """Fetch the background/s configuration"""
     try:
@@ -67,12 +138,14 @@ def get_background_config(mode: str):
 
     # Handle default / not supported background using default option.
     # Default : pick random from supported background.
+    background_options = get_background_options()
     if not choice or choice not in background_options[mode]:
         choice = random.choice(list(background_options[mode].keys()))
 
     return background_options[mode][choice]
 
 
+@traced()
 def download_background_video(background_config: Tuple[str, str, str, Any]):
     """Downloads the background/s video from YouTube."""
     Path("./assets/backgrounds/video/").mkdir(parents=True, exist_ok=True)
@@ -91,11 +164,16 @@ def download_background_video(background_config: Tuple[str, str, str, Any]):
         "retries": 10,
     }
 
+    import yt_dlp
+
     with yt_dlp.YoutubeDL(ydl_opts) as ydl:
         ydl.download(uri)
     print_substep("Background video downloaded successfully! 🎉", style="bold green")
+    print_substep("Indexing the background video...")
+    get_media_info(f"assets/backgrounds/video/{credit}-{filename}")
 
 
+@traced()
 def download_background_audio(background_config: Tuple[str, str, str]):
     """Downloads the background/s audio from YouTube."""
     Path("./assets/backgrounds/audio/").mkdir(parents=True, exist_ok=True)
@@ -114,55 +192,84 @@ def download_background_audio(background_config: Tuple[str, str, str]):
         "extract_audio": True,
     }
 
+    import yt_dlp
+
     with yt_dlp.YoutubeDL(ydl_opts) as ydl:
         ydl.download([uri])
 
     print_substep("Background audio downloaded successfully! 🎉", style="bold green")
+    get_media_info(f"assets/backgrounds/audio/{credit}-{filename}")
 
 
+@traced()
 def chop_background(background_config: Dict[str, Tuple], video_length: int, reddit_object: dict):
     """Generates the background audio and footage to be used in the video and writes it to assets/temp/background.mp3 and assets/temp/background.mp4
 
+    With background_audio_pcm the audio isn't written, its segment of the PCM
+    cache is recorded in assets/temp/{id}/background.json along with the video cut.
+
     Args:
         background_config (Dict[str,Tuple]]) : Current background configuration
         video_length (int): Length of the clip where the background footage is to be taken out of
     """
     id = reddit_object["id"]
     print(id)
+    cut = {}
     if settings.config["settings"]["background"][f"background_audio_volume"] == 0:
         print_step("Volume was set to 0. Skipping background audio creation . . .")
+    elif settings.config["settings"]["background"].get("background_audio_pcm", False):
+        print_step("Finding a spot in the backgrounds audio to chop...✂️")
+        audio_choice = f"{background_config['audio'][2]}-{background_config['audio'][1]}"
+        # decoded once per asset, every short just reads its segment of the raw samples
+        audio_pcm = build_pcm(audio_choice)
+        start_time_audio, _ = get_start_and_end_times(video_length, pcm_duration(audio_pcm))
+        cut["audio"] = {"pcm": audio_pcm, "start": start_time_audio, "duration": video_length}
     else:
         print_step("Finding a spot in the backgrounds audio to chop...✂️")
         audio_choice = f"{background_config['audio'][2]}-{background_config['audio'][1]}"
-        background_audio = AudioFileClip(f"assets/backgrounds/audio/{audio_choice}")
         start_time_audio, end_time_audio = get_start_and_end_times(
-            video_length, background_audio.duration
+            video_length, get_media_info(f"assets/backgrounds/audio/{audio_choice}")["duration"]
         )
+        from moviepy.editor import AudioFileClip
+
+        background_audio = AudioFileClip(f"assets/backgrounds/audio/{audio_choice}")
         background_audio = background_audio.subclip(start_time_audio, end_time_audio)
         background_audio.write_audiofile(f"assets/temp/{id}/background.mp3")
 
     print_step("Finding a spot in the backgrounds video to chop...✂️")
     video_choice = f"{background_config['video'][2]}-{background_config['video'][1]}"
-    background_video = VideoFileClip(f"assets/backgrounds/video/{video_choice}")
+    use_proxy = settings.config["settings"]["background"].get("background_proxy", False)
+    if use_proxy:
+        # already cropped and scaled to the output size, built once per asset
+        video_source = build_proxy(
+            background_config["video"],
+            int(settings.config["settings"]["resolution_w"]),
+            int(settings.config["settings"]["resolution_h"]),
+        )
+    else:
+        video_source = f"assets/backgrounds/video/{video_choice}"
+    video_info = get_media_info(video_source)
     start_time_video, end_time_video = get_start_and_end_times(
-        video_length, background_video.duration
+        video_length, video_info["duration"]
     )
-    # Extract video subclip
-    try:
-        ffmpeg_extract_subclip(
-            f"assets/backgrounds/video/{video_choice}",
-            start_time_video,
-            end_time_video,
-            targetname=f"assets/temp/{id}/background.mp4",
-        )
-    except (OSError, IOError):  # ffmpeg issue see #348
-        print_substep("FFMPEG issue. Trying again...")
-        with VideoFileClip(f"assets/backgrounds/video/{video_choice}") as video:
-            new = video.subclip(start_time_video, end_time_video)
-            new.write_videofile(f"assets/temp/{id}/background.mp4")
+    # cut on a keyframe so the segment can be stream copied
+    start_time_video = snap_to_keyframe(
+        start_time_video, video_info.get("keyframes", []), video_info["duration"] - video_length
+    )
+    cut_background_video(
+        video_source,
+        start_time_video,
+        video_length,
+        f"assets/temp/{id}/background.mp4",
+    )
+    # the cut ends on a packet boundary, the renderer trims it to the exact length
+    cut["video"] = {
+        "source": video_source,
+        "start": start_time_video,
+        "duration": video_length,
+        "proxy": bool(use_proxy),
+    }
+    with open(f"assets/temp/{id}/background.json", "w") as json_file:
+        json.dump(cut, json_file, indent=4)
     print_substep("Background video chopped successfully!", style="bold green")
     return background_config["video"][2]
-
-
-# Create a tuple for downloads background (background_audio_options, background_video_options)
-background_options = load_background_options()
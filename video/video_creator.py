@@ -1,88 +1,143 @@
 import ffmpeg
-import multiprocessing
 import threading
-import tempfile
-import time
 from tqdm import tqdm
 
-from typing import Dict, Final, Tuple
+from typing import IO, Callable, Dict, Final, Optional, Tuple
 from rich.progress import track
 from rich.console import Console
 from os.path import exists  # Needs to be imported specifically
 import os
 from utils import settings
 from utils.cleanup import cleanup
+from utils.cpu_budget import budget, current_lease
 from utils.console import (
     print_step,
     print_substep
 )
+from utils.media_probe import probe_duration
+from utils.tracing import traced, tracer
+from video.audio_bus import AudioBus, use_audio_bus
+from video.encode_profiles import encode_args
+from video.video_background import background_audio_input, read_background_cut
 
 from text.text_captions import (
-    transcribe_audio,
-    generate_captions
+    get_word_timings,
+    generate_captions,
+    transcribes_locally
 )
 from utils.thread_return import (
     ThreadWithReturnValue
 )
+from video.render_graph import (
+    render_single_pass,
+    write_transcription_audio
+)
 import threading
 
 console = Console()
 
 class ProgressFfmpeg(threading.Thread):
-    def __init__(self, vid_duration_seconds, progress_update_callback):
+    """Runs an ffmpeg command while reading its -progress stream from a pipe.
+
+    Every progress block drives the callback and is recorded as a counter
+    (fps, speed, out_time) of the global tracer.
+    """
+
+    def __init__(self, vid_duration_seconds, progress_update_callback, name="ffmpeg"):
         threading.Thread.__init__(self, name="ProgressFfmpeg")
-        self.stop_event = threading.Event()
-        self.output_file = tempfile.NamedTemporaryFile(mode="w+", delete=False)
         self.vid_duration_seconds = vid_duration_seconds
         self.progress_update_callback = progress_update_callback
+        self.trace_name = name
+        self.process = None
 
     def run(self):
-        while not self.stop_event.is_set():
-            latest_progress = self.get_latest_ms_progress()
-            if latest_progress is not None:
-                completed_percent = latest_progress / self.vid_duration_seconds
-                self.progress_update_callback(completed_percent)
-            time.sleep(1)
-
-    def get_latest_ms_progress(self):
-        lines = self.output_file.readlines()
-
-        if lines:
-            for line in lines:
-                if "out_time_ms" in line:
-                    out_time_ms_str = line.split("=")[1].strip()
-                    if out_time_ms_str.isnumeric():
-                        return float(out_time_ms_str) / 1000000.0
-                    else:
-                        # Handle the case when "N/A" is encountered
-                        return None
-        return None
-
-    def stop(self):
-        self.stop_event.set()
-
-    def __enter__(self):
-        self.start()
-        return self
+        block = {}
+        for line in self.process.stdout:
+            key, _, value = line.decode("utf8", errors="replace").strip().partition("=")
+            block[key] = value
+            if key == "progress":  # last line of every block
+                self.report(block)
+                block = {}
+
+    def report(self, block: Dict[str, str]):
+        # out_time_ms is in microseconds too, despite its name
+        out_time_us = block.get("out_time_us") or block.get("out_time_ms", "")
+        out_time = float(out_time_us) / 1000000.0 if out_time_us.isnumeric() else None
+        speed = block.get("speed", "").rstrip("x").strip()
+        try:
+            fps = float(block.get("fps", ""))
+        except ValueError:
+            fps = 0.0
+        tracer.counter(
+            self.trace_name,
+            fps=fps,
+            speed=float(speed) if speed.replace(".", "", 1).isnumeric() else 0.0,
+            out_time=out_time or 0.0,
+        )
+        if out_time is not None:
+            self.progress_update_callback(out_time / self.vid_duration_seconds)
+
+    def execute(self, output, feed: Optional[Callable[[IO[bytes]], None]] = None):
+        """Runs the ffmpeg output node, raising ffmpeg.Error when it fails.
 
-    def __exit__(self, *args, **kwargs):
-        self.stop()
+        Args:
+            output: ffmpeg output node
+            feed (Callable, optional): Writes the input of a "pipe:" input to the
+                stdin it receives, from its own thread. stdin is closed once it returns.
+        """
+        lease = current_lease()
+        if lease is not None:
+            output = output.global_args(*lease.ffmpeg_global_args())
+        self.process = output.global_args("-progress", "pipe:1", "-nostats").run_async(
+            pipe_stdin=feed is not None, pipe_stdout=True, pipe_stderr=True
+        )
+        if lease is not None:
+            # before ffmpeg has opened its inputs, so its encoder threads inherit the mask
+            lease.pin(self.process.pid)
+        feeder = None
+        feed_errors = []
+        if feed is not None:
+            def feed_stdin():
+                try:
+                    feed(self.process.stdin)
+                except BrokenPipeError:  # ffmpeg exited, its stderr tells why
+                    pass
+                except Exception as e:
+                    feed_errors.append(e)
+                finally:
+                    try:
+                        self.process.stdin.close()
+                    except BrokenPipeError:
+                        pass
 
+            feeder = threading.Thread(target=feed_stdin, name="ProgressFfmpegFeed")
+            feeder.start()
+        self.start()
+        stderr = self.process.stderr.read()
+        self.process.wait()
+        self.join()
+        if feeder is not None:
+            feeder.join()
+        if feed_errors:
+            raise feed_errors[0]
+        if self.process.returncode != 0:
+            raise ffmpeg.Error("ffmpeg", None, stderr)
 
-def prepare_background(id: str, W: int, H: int) -> str:
+
+@traced()
+def prepare_background(id: str, W: int, H: int, length: Optional[float] = None) -> str:
     output_path = f"assets/temp/{id}/background_noaudio.mp4"
+    background = ffmpeg.input(f"assets/temp/{id}/background.mp4")
+    if length is not None:
+        # the stream copied cut ends on a packet boundary, trim it to the exact length
+        background = background.filter("trim", duration=length).filter("setpts", "PTS-STARTPTS")
     output = (
-        ffmpeg.input(f"assets/temp/{id}/background.mp4")
+        background
         .filter("crop", f"ih*({W}/{H})", "ih")
         .output(
             output_path,
             an=None,
-            **{
-                "c:v": "h264",
-                "b:v": "20M",
-                "b:a": "192k",
-                "threads": multiprocessing.cpu_count(),
-            },
+            **encode_args(audio=False),
         )
         .overwrite_output()
     )
@@ -93,6 +148,22 @@ def prepare_background(id: str, W: int, H: int) -> str:
         exit(1)
     return output_path
 
+def background_stream(id: str, W: int, H: int, length: float):
+    """The background video of the short, cropped to W:H and trimmed to length.
+
+    Backgrounds cut from a proxy already have the output size, so they skip the
+    intermediate background_noaudio.mp4 encode.
+    """
+    if read_background_cut(id).get("video", {}).get("proxy"):
+        return (
+            ffmpeg.input(f"assets/temp/{id}/background.mp4")
+            .video.filter("trim", duration=length)
+            .filter("setpts", "PTS-STARTPTS")
+        )
+    return ffmpeg.input(prepare_background(id, W=W, H=H, length=length))
+
+
+@traced()
 def merge_background_audio(audio: ffmpeg, id: str):
     """Gather an audio and merge with assets/backgrounds/background.mp3
     Args:
@@ -102,10 +173,10 @@ def merge_background_audio(audio: ffmpeg, id: str):
     
     background_audio_volume = settings.config["settings"]["background"]["background_audio_volume"]
     if background_audio_volume == 0:
-        return audio  # Return the original audio
+        return [audio, f"assets/temp/{id}/audio.mp3"]  # Return the original audio
     else:
         # sets volume to config
-        bg_audio = ffmpeg.input(f"assets/temp/{id}/background.mp3").filter(
+        bg_audio = background_audio_input(id).filter(
             "volume",
             background_audio_volume,
         )
@@ -113,17 +184,19 @@ def merge_background_audio(audio: ffmpeg, id: str):
         merged_audio = ffmpeg.filter([audio, bg_audio], "amix", duration="longest")
         merged_audio_path = f"assets/temp/{id}/merged-audio.mp3"
         ffmpeg.output(
-            merged_audio, merged_audio_path, **{"b:a": "192k"}
+            merged_audio, merged_audio_path, **{"b:a": encode_args(video=False)["b:a"]}
         ).overwrite_output().run(quiet=True)
 
         return [merged_audio, merged_audio_path]  # Return merged audio
 
+@traced()
 def generate_video(
     video,
     audio,
     length,
     path,
     id,
+    feed: Optional[Callable[[IO[bytes]], None]] = None,
 ):
     
     print_step("Generating the final video 🎥")
@@ -136,79 +209,184 @@ def generate_video(
         old_percentage = pbar.n
         pbar.update(status - old_percentage)
 
-    with ProgressFfmpeg(length, on_update_example) as progress:
-        try:
-            ffmpeg.output(
-                audio,
-                video,
-                path,
-                f="mp4",
-                **{
-                    "c:v": "h264",
-                    "b:v": "20M",
-                    "b:a": "192k",
-                    "threads": multiprocessing.cpu_count(),
-                },
-            ).overwrite_output().global_args("-progress", progress.output_file.name).run(
-                quiet=True,
-                overwrite_output=True,
-                capture_stdout=False,
-                capture_stderr=False,
+    try:
+        with budget.stage("encode"):
+            ProgressFfmpeg(length, on_update_example, name="generate_video").execute(
+                ffmpeg.output(
+                    audio,
+                    video,
+                    path,
+                    f="mp4",
+                    **encode_args(),
+                ).overwrite_output(),
+                feed=feed,
             )
-            ffmpeg.probe(path, cmd='ffprobe')
-        except ffmpeg.Error as e:
-            print(e.stderr.decode("utf8"))
-            exit(1)
+        ffmpeg.probe(path, cmd='ffprobe')
+    except ffmpeg.Error as e:
+        print(e.stderr.decode("utf8"))
+        exit(1)
 
     old_percentage = pbar.n
     pbar.update(100 - old_percentage)
 
     pbar.close()
 
+
+def result_path(path: str, name: str) -> str:
+    video_path = path + f"/{name}"
+    return (
+        video_path[:251] + ".mp4"
+    )  # Prevent a error by limiting the path length, do not change this.
+
+
+def remove_temporary_files(id: str):
     print_step("Removing temporary files 🗑")
     cleanups = cleanup(id)
     print_substep(f"Removed {cleanups} temporary files 🗑")
 
 
+@traced()
+def prepare_audio(id: str, number_of_clips: int):
+    """Concatenates the TTS chunks into assets/temp/{id}/audio.mp3 and mixes in the background audio.
+
+    Returns:
+        [ffmpeg stream, str]: The final audio and the path it was written to
+    """
+    audio_clips = [
+        ffmpeg.input(f"assets/temp/{id}/mp3/output_chunk_{i+1}.mp3")
+        for i in track(range(number_of_clips), "Collecting the audio files...")
+    ]
+    audio_concat = ffmpeg.concat(*audio_clips, a=1, v=0)
+    
+    ffmpeg.output(
+        audio_concat, f"assets/temp/{id}/audio.mp3", **{"b:a": encode_args(video=False)["b:a"]}
+    ).overwrite_output().run(quiet=True)
+
+    audio = ffmpeg.input(f"assets/temp/{id}/audio.mp3")
+    return merge_background_audio(audio, id)
+
+
+def transcribe_job(obj, number_of_clips: int, bus: Optional[AudioBus] = None):
+    """Word timings of the short, preparing the transcription input first when whisper needs it."""
+    if settings.config["settings"].get("transcription", {}).get("timing", "whisper") == "align":
+        return get_word_timings(obj, None)
+    if use_audio_bus():
+        bus = bus or AudioBus(obj["id"], number_of_clips)
+        return get_word_timings(obj, bus.for_transcription())
+    return get_word_timings(obj, write_transcription_audio(obj["id"], number_of_clips))
+
+
+def render_video(
+    obj,
+    number_of_clips: int,
+    length: float,
+    path: str,
+    word_timings=None,
+    bus: Optional[AudioBus] = None,
+) -> str:
+    """Renders the short into the results folder, without removing the temporary files.
+
+    With render_mode = "single_pass" the captions are drawn by the same graph,
+    otherwise the video still needs caption_video.
+
+    Args:
+        bus (AudioBus, optional): The bus transcribe_job already decoded, so the voice isn't decoded twice
+
+    Returns:
+        str: Path of the rendered video
+    """
+    W: Final[int] = int(settings.config["settings"]["resolution_w"])
+    H: Final[int] = int(settings.config["settings"]["resolution_h"])
+    id = obj["id"]
+
+    if bus is None and use_audio_bus():
+        bus = AudioBus(id, number_of_clips)
+    if settings.config["settings"].get("render_mode", "legacy") == "single_pass":
+        captions_video_path = result_path(path, "final_video_captions")
+        return render_single_pass(id, number_of_clips, length, W, H, captions_video_path, word_timings, bus)
+
+    background_clip = background_stream(id, W, H, length)
+    video_path = result_path(path, "final_video")
+    if bus is not None:
+        generate_video(background_clip, bus.input(), length, video_path, id, feed=bus.feed)
+        return video_path
+    [final_audio, _] = prepare_audio(id, number_of_clips)
+    generate_video(background_clip, final_audio, length, video_path, id)
+    return video_path
+
+
+def caption_video(word_timings, video_path: str, path: str) -> str:
+    """Burns the captions into video_path.
+
+    Returns:
+        str: Path of the captioned video
+    """
+    captions_video_path = result_path(path, "final_video_captions")
+    generate_captions(word_timings, video_path, captions_video_path)
+    return captions_video_path
+
+
+@traced()
 def make_final_video(
     obj,   
     number_of_clips: int,
-    length: int,
+    length: Optional[float],
     path: str,
-):
+) -> str:
+    """Renders the short into path and burns its captions in, then removes the temporary files.
+
+    Every render mode returns the same thing, the audio is only an intermediate
+    of the temporary workspace (or never written at all with the audio bus).
+
+    Returns:
+        str: Path of the captioned video
+    """
     # settings values
     W: Final[int] = int(settings.config["settings"]["resolution_w"])
     H: Final[int] = int(settings.config["settings"]["resolution_h"])
     
     id = obj["id"]
 
+    if length is None:
+        # read from the mp3 headers of the chunks, nothing is decoded
+        length = sum(
+            probe_duration(f"assets/temp/{id}/mp3/output_chunk_{i+1}.mp3") for i in range(number_of_clips)
+        )
+
+    if settings.config["settings"].get("render_mode", "legacy") == "single_pass":
+        return make_single_pass_video(obj, number_of_clips, length, path)
+
     print_step("Creating the final video 🎥")
-    background_clip = ffmpeg.input(prepare_background(id, W=W, H=H))
+    background_clip = background_stream(id, W, H, length)
 
-    audio_clips = list()
-    audio_clips = [
-        ffmpeg.input(f"assets/temp/{id}/mp3/output_chunk_{i+1}.mp3")
-        for i in track(range(number_of_clips), "Collecting the audio files...")
-    ]
-    audio_concat = ffmpeg.concat(*audio_clips, a=1, v=0)
-    
-    ffmpeg.output(
-        audio_concat, f"assets/temp/{id}/audio.mp3", **{"b:a": "192k"}
-    ).overwrite_output().run(quiet=True)
+    # whisper and the encoder run side by side, reserved together so they split the cores
+    if transcribes_locally():
+        encode_lease, transcribe_lease = budget.reserve("encode", "transcribe")
+    else:
+        [encode_lease], transcribe_lease = budget.reserve("encode"), None
+
+    if use_audio_bus():
+        # decoded once here, mixed and piped to the encoder while whisper reads its 16kHz copy
+        bus = AudioBus(id, number_of_clips).load()
+        final_audio, final_audio_path = bus.input(), None
+        audio_target, audio_args = transcribe_job, (obj, number_of_clips, bus)
+        feed = bus.feed
+    else:
+        [final_audio, final_audio_path] = prepare_audio(id, number_of_clips)
+        print(final_audio_path)
+        audio_target, audio_args = get_word_timings, (obj, f"assets/temp/{id}/audio.mp3")
+        feed = None
+    if transcribe_lease is not None:
+        audio_target = transcribe_lease.bind(audio_target)
+    audio_thread = ThreadWithReturnValue(target=audio_target, args=audio_args)
     
     console.log(f"[bold green] Video Will Be: {length} Seconds Long")
 
-    audio = ffmpeg.input(f"assets/temp/{id}/audio.mp3")
-    [final_audio, final_audio_path] = merge_background_audio(audio, id)
-
-    video_path = path + f"/final_video"
-    video_path = (
-        video_path[:251] + ".mp4"
-    )  # Prevent a error by limiting the path length, do not change this.
-    print(final_audio_path)
+    video_path = result_path(path, "final_video")
 
-    audio_thread = ThreadWithReturnValue(target=transcribe_audio, args=(f"assets/temp/{id}/audio.mp3",))
-    video_thread = ThreadWithReturnValue(target=generate_video, args=(background_clip, final_audio, length, video_path, id))
+    video_thread = ThreadWithReturnValue(
+        target=encode_lease.bind(generate_video), args=(background_clip, final_audio, length, video_path, id, feed)
+    )
     
     audio_thread.start()
     video_thread.start()
@@ -216,11 +394,40 @@ def make_final_video(
     word_timings = audio_thread.join()
     video_thread.join()
 
-    captions_video_path = path + f"/final_video_captions"
-    captions_video_path = (
-        captions_video_path[:251] + ".mp4"
-    )  # Prevent a error by limiting the path length, do not change this.
-    
-    generate_captions(word_timings, video_path, captions_video_path)
+    captions_video_path = caption_video(word_timings, video_path, path)
+    remove_temporary_files(id)
+
+    return captions_video_path
+
+@traced()
+def make_single_pass_video(
+    obj,
+    number_of_clips: int,
+    length: int,
+    path: str,
+):
+    """Same result as make_final_video, but the background, the audio mix and the
+    captions are rendered by one ffmpeg graph, so video and audio are encoded once.
+
+    Returns:
+        str: Path of the captioned video
+    """
+    W: Final[int] = int(settings.config["settings"]["resolution_w"])
+    H: Final[int] = int(settings.config["settings"]["resolution_h"])
+
+    id = obj["id"]
+
+    print_step("Creating the final video 🎥")
+    console.log(f"[bold green] Video Will Be: {length} Seconds Long")
+
+    bus = AudioBus(id, number_of_clips) if use_audio_bus() else None
+    # the captions are drawn inside the graph, so the timings are needed up front
+    word_timings = transcribe_job(obj, number_of_clips, bus)
+
+    captions_video_path = result_path(path, "final_video_captions")
+    render_single_pass(id, number_of_clips, length, W, H, captions_video_path, word_timings, bus)
+
+    remove_temporary_files(id)
+    print_step("Done! 🎉 The video is in the results folder 📁")
 
-    return [path, final_audio_path]
\ No newline at end of file
+    return captions_video_path
@@ -0,0 +1,180 @@
+import json
+import os
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+from utils import settings
+from utils.console import print_step, print_substep
+from utils.media_probe import probe_duration
+from voices.segmentation import REPLACEMENTS, normalize_text, segment_text
+from voices.tts_cache import TTSCache
+
+__all__ = ["TTSProvider", "TTSChunkError", "chunk_text"]
+
+
+class TTSChunkError(Exception):
+    """A chunk could not be synthesized, the short would miss part of its speech."""
+
+    def __init__(self, index: int, filename: str):
+        self.index = index
+        self.filename = filename
+        super().__init__(f"Chunk {index} could not be synthesized into {filename}")
+
+
+def chunk_text(text: str, chunk_size: int = 300) -> list:
+    """Splits text into chunks of up to 'chunk_size' characters, on sentence boundaries when possible."""
+    return segment_text(text, max_chars=chunk_size)
+
+
+class TTSProvider(ABC):
+    """Text-to-speech engine writing one mp3 per chunk of text into assets/temp/{identifier}/mp3.
+
+    Subclasses implement synthesize_chunk_to and voices, splitting, caching,
+    concurrency and the chunks.json manifest are shared.
+
+    Args:
+        identifier (str): Id of the short
+        path (str): Folder of the temporary files
+    """
+
+    name: str = "provider"
+    # offline: works without network, max_chars/max_bytes: longest chunk accepted,
+    # streaming: chunks can be consumed while the later ones are synthesized
+    capabilities: Dict = {"offline": False, "max_chars": 300, "max_bytes": None, "streaming": True}
+    replacements: Dict[str, str] = REPLACEMENTS
+
+    def __init__(self, identifier: str, path: str = "assets/temp/"):
+        tts_settings = settings.config["settings"]["tts"]
+        self.max_in_flight = 4
+        self.cache = (
+            TTSCache(max_bytes=int(tts_settings.get("cache_max_mb", 2048)) * 1024**2)
+            if tts_settings.get("cache_enabled", True)
+            else None
+        )
+        self.chunk_count = 0
+        self._identifier = identifier
+        self.path = path + self._identifier + "/mp3"
+        os.makedirs(self.path, exist_ok=True)
+
+    @abstractmethod
+    def voices(self) -> List[str]:
+        """Names of the voices the engine accepts."""
+
+    @abstractmethod
+    def default_voice(self) -> Optional[str]:
+        """The voice configured in [settings.tts]."""
+
+    @abstractmethod
+    def synthesize_chunk_to(self, chunk: str, voice: Optional[str], filename: str) -> bool:
+        """Writes the speech of chunk to the mp3 filename.
+
+        Returns:
+            bool: Whether the file was written
+        """
+
+    def random_voice(self) -> Optional[str]:
+        return self.default_voice()
+
+    def split_text(self, text: str) -> List[str]:
+        """Normalizes text and segments it into chunks balanced for max_in_flight requests."""
+        return segment_text(
+            normalize_text(text, self.replacements),
+            max_chars=self.capabilities["max_chars"],
+            max_bytes=self.capabilities.get("max_bytes"),
+            concurrency=self.max_in_flight,
+        )
+
+    def run(self, text: str, random_voice: bool = False):
+        """Run voice"""
+        voice = self.random_voice() if random_voice else self.default_voice()
+
+        print_step(f"Generating voices for video '{self._identifier}'")
+        print_substep(f"Audios will be stored in [green]{self.path}")
+
+        [total_duration, number_of_clips] = self.get_voices(voice=voice, text=text)
+        print_substep(f"Total duration of all audio chunks: {total_duration} seconds")
+        return [total_duration, number_of_clips]  # Return the total duration
+
+    def get_voices(self, text: str, voice: Optional[str] = None, output_filename: str = "output") -> float:
+        """Synthesizes every chunk of text and calculates the total duration.
+
+        Returns:
+            [float, int]: Total duration and number of chunks
+
+        Raises:
+            TTSChunkError: When a chunk could not be synthesized
+        """
+        manifest = list(self.stream(text, voice, output_filename))
+        total_duration = sum(result["duration"] for result in manifest)
+        return [total_duration, self.chunk_count]
+
+    def stream(self, text: str, voice: Optional[str] = None, output_filename: str = "output") -> Iterator[Dict]:
+        """Yields {'index', 'text', 'duration', 'path'} for every chunk, in order, as soon
+        as it and the chunks before it are written. Later chunks keep being
+        synthesized while the consumer works on the earlier ones.
+
+        chunks.json is written once all are done.
+
+        Raises:
+            TTSChunkError: When a chunk could not be synthesized. The renderers
+                read output_chunk_1..chunk_count, a missing chunk can't be skipped.
+        """
+        text_chunks = self.split_text(text)
+        self.chunk_count = len(text_chunks)
+        cached = (
+            sum(self.cache.contains(TTSCache.key(self.name, voice, chunk)) for chunk in text_chunks)
+            if self.cache is not None
+            else 0
+        )
+        print_substep(
+            f"Splitted text-to-speech content into {len(text_chunks)} chunks, "
+            f"{len(text_chunks) - cached} requests expected ({cached} cached)"
+        )
+
+        manifest = []
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            futures = [
+                pool.submit(self.synthesize_chunk, i, chunk, voice, output_filename, len(text_chunks))
+                for i, chunk in enumerate(text_chunks)
+            ]
+            for i, future in enumerate(futures):
+                result = future.result()
+                if result is None:
+                    for pending in futures:
+                        pending.cancel()
+                    raise TTSChunkError(i + 1, f"{self.path}/{output_filename}_chunk_{i + 1}.mp3")
+                manifest.append(result)
+                yield result
+
+        # chunk texts and durations, used to align the script without transcribing it
+        with open(f"{self.path}/chunks.json", "w", encoding="utf-8") as manifest_file:
+            json.dump(manifest, manifest_file, ensure_ascii=False, indent=4)
+
+    def synthesize_chunk(
+        self,
+        i: int,
+        chunk: str,
+        voice: Optional[str],
+        output_filename: str,
+        count: int,
+    ) -> Optional[Dict]:
+        """Writes a single chunk into {output_filename}_chunk_{i + 1}.mp3, from the cache when possible."""
+        chunk_filename = f"{self.path}/{output_filename}_chunk_{i + 1}.mp3"
+        cache_key = TTSCache.key(self.name, voice, chunk)
+        if self.cache is not None:
+            chunk_duration = self.cache.get(cache_key, chunk_filename)
+            if chunk_duration is not None:
+                print_substep(f"Chunk {i + 1}/{count} found in the TTS cache")
+                return {"index": i + 1, "text": chunk, "duration": chunk_duration, "path": chunk_filename}
+
+        print_substep(f"Generating audio for chunk {i + 1}/{count}")
+        if not self.synthesize_chunk_to(chunk, voice, chunk_filename):
+            return None
+        print_substep(f"Chunk {i + 1} saved successfully as {chunk_filename}")
+
+        # Calculate the duration of the chunk from its mp3 headers
+        chunk_duration = probe_duration(chunk_filename)
+        if self.cache is not None:
+            self.cache.put(cache_key, chunk_filename, chunk_duration)
+        return {"index": i + 1, "text": chunk, "duration": chunk_duration, "path": chunk_filename}
@@ -0,0 +1,73 @@
+import os
+import shutil
+import subprocess
+from functools import lru_cache
+from typing import List, Optional
+
+import ffmpeg
+
+from utils import settings
+from utils.console import print_substep
+from utils.tracing import tracer
+from voices.base import TTSProvider
+
+__all__ = ["ESpeak"]
+
+
+@lru_cache(maxsize=None)
+def espeak_binary() -> Optional[str]:
+    return shutil.which("espeak-ng") or shutil.which("espeak")
+
+
+class ESpeak(TTSProvider):
+    """Offline text-to-speech with espeak-ng.
+
+    Every chunk is one espeak-ng process piping its wav into ffmpeg, so chunks
+    are synthesized in parallel on the local CPUs, without network round trips
+    or rate limits.
+    """
+
+    name = "espeak"
+    capabilities = {"offline": True, "max_chars": 500, "max_bytes": None, "streaming": True}
+
+    def __init__(self, identifier: str, path: str = "assets/temp/"):
+        super().__init__(identifier, path)
+        if espeak_binary() is None:
+            raise FileNotFoundError("espeak-ng was not found, install it or choose another voice_choice")
+        tts_settings = settings.config["settings"]["tts"]
+        self.speed = int(tts_settings.get("espeak_speed", 175))
+        self.max_in_flight = os.cpu_count() or 1
+
+    def voices(self) -> List[str]:
+        # espeak-ng --voices prints a header, then "Pty Language Age/Gender VoiceName File Other"
+        listing = subprocess.run([espeak_binary(), "--voices"], capture_output=True, text=True).stdout
+        return [line.split()[1] for line in listing.splitlines()[1:] if line.strip()]
+
+    def default_voice(self) -> Optional[str]:
+        return settings.config["settings"]["tts"].get("espeak_voice", "es")
+
+    def random_voice(self) -> str:
+        # a random language would not match the script, stick to the configured one
+        return self.default_voice()
+
+    def synthesize_chunk_to(self, chunk: str, voice: Optional[str], filename: str) -> bool:
+        # the text goes through stdin, as an argument a chunk starting with "-" would be read as an option
+        args = [espeak_binary(), "--stdout", "--stdin", "-b", "1", "-s", str(self.speed)]
+        if voice is not None:
+            args += ["-v", voice]
+        with tracer.span("tts_request", cat="tts", chars=len(chunk)):
+            synthesis = subprocess.run(args, input=chunk.encode("utf-8"), capture_output=True)
+            if synthesis.returncode != 0:
+                print_substep(f"espeak-ng failed for {filename}: {synthesis.stderr.decode('utf8')}")
+                return False
+            try:
+                (
+                    ffmpeg.input("pipe:", format="wav")
+                    .output(filename, **{"b:a": "128k"})
+                    .overwrite_output()
+                    .run(input=synthesis.stdout, quiet=True)
+                )
+            except ffmpeg.Error as e:
+                print(e.stderr.decode("utf8"))
+                return False
+        return True
@@ -0,0 +1,130 @@
+import math
+import re
+import textwrap
+import unicodedata
+from typing import Dict, List, Optional
+
+__all__ = ["REPLACEMENTS", "normalize_text", "segment_text"]
+
+# applied once to the whole script, before it is segmented
+REPLACEMENTS: Dict[str, str] = {
+    "+": "plus",
+    "&": "and",
+    "r/": "",
+}
+
+# chunks shorter than this sound choppy, they are only produced when the text is this short
+MIN_BALANCED_CHARS = 60
+
+_SENTENCE_END = re.compile(r"(?:(?<=[.!?…])|(?<=[.!?…][\"'»”)]))\s+")
+_CLAUSE_END = re.compile(r"(?<=[,;:—])\s+")
+
+
+def normalize_text(text: str, replacements: Optional[Dict[str, str]] = None) -> str:
+    """NFC normalizes text, applies the replacements in a single pass and collapses whitespace."""
+    replacements = REPLACEMENTS if replacements is None else replacements
+    text = unicodedata.normalize("NFC", text)
+    if replacements:
+        pattern = re.compile("|".join(re.escape(old) for old in sorted(replacements, key=len, reverse=True)))
+        text = pattern.sub(lambda match: replacements[match.group(0)], text)
+    return " ".join(text.split())
+
+
+def _fits(piece: str, max_chars: int, max_bytes: int) -> bool:
+    return len(piece) <= max_chars and len(piece.encode("utf-8")) <= max_bytes
+
+
+def _split_words(text: str, max_chars: int, max_bytes: int) -> List[str]:
+    """Last resort: wraps on spaces, and inside words longer than the limits."""
+    pieces = []
+    for line in textwrap.wrap(text, width=max_chars, break_long_words=True):
+        while not _fits(line, max_chars, max_bytes):
+            cut = max_chars
+            while not _fits(line[:cut], max_chars, max_bytes):
+                cut -= 1
+            pieces.append(line[:cut])
+            line = line[cut:]
+        pieces.append(line)
+    return pieces
+
+
+def atoms(text: str, max_chars: int, max_bytes: int) -> List[str]:
+    """The smallest pieces the text is cut into: sentences, or clauses and words of the
+    sentences that don't fit in a request."""
+    pieces = []
+    for sentence in filter(None, _SENTENCE_END.split(text)):
+        if _fits(sentence, max_chars, max_bytes):
+            pieces.append(sentence)
+            continue
+        for clause in filter(None, _CLAUSE_END.split(sentence)):
+            if _fits(clause, max_chars, max_bytes):
+                pieces.append(clause)
+            else:
+                pieces += _split_words(clause, max_chars, max_bytes)
+    return pieces
+
+
+def _pack(pieces: List[str], capacity: int, max_chars: int, max_bytes: int) -> List[str]:
+    """Greedily joins consecutive pieces while the chunk stays within capacity characters."""
+    chunks = []
+    for piece in pieces:
+        if chunks:
+            joined = f"{chunks[-1]} {piece}"
+            if len(joined) <= capacity and _fits(joined, max_chars, max_bytes):
+                chunks[-1] = joined
+                continue
+        chunks.append(piece)
+    return chunks
+
+
+def segment_text(
+    text: str,
+    max_chars: int = 300,
+    max_bytes: Optional[int] = None,
+    concurrency: int = 1,
+) -> List[str]:
+    """Splits text into TTS requests on sentence boundaries, falling back to clauses
+    and then words, keeping every chunk within max_chars characters and max_bytes
+    UTF-8 bytes.
+
+    A request takes roughly a fixed overhead plus a time proportional to its
+    length, so with concurrency requests in flight the wall time is set by the
+    longest chunk of each wave. The chunk count is rounded up to a multiple of
+    concurrency and the chunks are balanced to make the longest one as short as
+    possible, without going under MIN_BALANCED_CHARS.
+
+    Args:
+        text (str): Normalized text
+        max_chars (int): Characters accepted per request
+        max_bytes (int, optional): UTF-8 bytes accepted per request, 4 * max_chars by default
+        concurrency (int): Requests synthesized at the same time
+
+    Returns:
+        List[str]: The chunks, in order
+    """
+    if not isinstance(text, str):
+        raise ValueError("The input text must be a string.")
+    max_bytes = max_bytes or 4 * max_chars
+    pieces = atoms(text, max_chars, max_bytes)
+    if not pieces:
+        return []
+
+    chunks = _pack(pieces, max_chars, max_chars, max_bytes)
+    if concurrency <= 1:
+        return chunks
+
+    total = sum(len(piece) for piece in pieces) + len(pieces) - 1
+    waves = math.ceil(len(chunks) / concurrency)
+    target = min(waves * concurrency, len(pieces), max(len(chunks), total // MIN_BALANCED_CHARS))
+    if target <= len(chunks):
+        return chunks
+
+    # smallest capacity that still packs the pieces into target chunks
+    low, high = max(len(piece) for piece in pieces), max_chars
+    while low < high:
+        capacity = (low + high) // 2
+        if len(_pack(pieces, capacity, max_chars, max_bytes)) <= target:
+            high = capacity
+        else:
+            low = capacity + 1
+    return _pack(pieces, low, max_chars, max_bytes)
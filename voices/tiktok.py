@@ -1,16 +1,15 @@
 # documentation for tiktok api: https://github.com/oscie57/tiktok-voice/wiki
-import os
-import base64
 import random
+import threading
 import time
-from typing import Optional, Final
+from typing import List, Optional, Final
 import requests
-import textwrap
 from utils import settings
-from utils.console import print_substep, print_step
-from pydub import AudioSegment
+from utils.console import print_substep
+from utils.tracing import tracer
+from voices.base import TTSProvider, chunk_text
 
-__all__ = ["TikTok", "TikTokTTSException"]
+__all__ = ["TikTok", "TikTokTTSException", "chunk_text"]
 
 disney_voices: Final[tuple] = (
     "en_us_ghostface",  # Ghost Face
@@ -76,96 +75,92 @@ vocals: Final[tuple] = (
     "en_female_ht_f08_wonderful_world",  # Dramatic
 )
 
-def chunk_text(text: str, chunk_size: int = 300) -> list:
-    """Splits text into chunks of up to 'chunk_size' bytes."""
-    # Ensure the input is a string
-    # print("cactoa")
-    # print(type(text))
-    if not isinstance(text, str):
-        raise ValueError("The input text must be a string.")
-    # Ensure text is encoded as bytes and split it while maintaining word boundaries
-    text_chunks = textwrap.wrap(text, width=chunk_size)
-    return text_chunks
-
-
-class TikTok:
+class TikTok(TTSProvider):
     """TikTok Text-to-Speech Wrapper"""
 
+    name = "tiktok"
+    capabilities = {"offline": False, "max_chars": 200, "max_bytes": 300, "streaming": True}
+
     def __init__(
             self,
             identifier: str, 
             path: str = "assets/temp/",
+            uri_base: Optional[str] = None,
         ):
+        super().__init__(identifier, path)
         headers = {
             "User-Agent": "com.zhiliaoapp.musically/2022600030 (Linux; U; Android 7.1.2; es_ES; SM-G988N; "
             "Build/NRD90M;tt-ok/3.12.13.1)",
             "Cookie": f"sessionid={settings.config['settings']['tts']['tiktok_sessionid']}",
         }
         #"https://tiktok-tts.weilnet.workers.dev/api/generation"
-        self.URI_BASE = (
+        self.URI_BASE = uri_base or (
             "https://tiktok-tts.weilbyte.dev/api/generate"
         )
-        self.max_chars = 200
-
-        self._session = requests.Session()
-        # set the headers to the session, so we don't have to do it for every request
-        self._session.headers = headers
-        self._identifier = identifier
-        
-        self.path = path + self._identifier + "/mp3"
-        os.makedirs(self.path, exist_ok=True)
-
-    def run(self, text: str, random_voice: bool = False):
-        """Run voice"""
-        if random_voice:
-            voice = self.random_voice()
-        else:
-            voice = settings.config["settings"]["tts"].get("tiktok_voice", None)
-
-        print_step(f"Generating voices for video '{self._identifier}'")
-        print_substep(f"Audios will be stored in [green]{self.path}")
-
-        [total_duration, number_of_clips] = self.get_voices(voice=voice, text=text)
-        print_substep(f"Total duration of all audio chunks: {total_duration} seconds")
-        return [total_duration, number_of_clips]  # Return the total duration
 
-    def get_voices(self, text: str, voice: Optional[str] = None, output_filename: str = "output") -> float:
-        """Downloads MP3 audio files for each chunk of text, saves them, and calculates total duration."""
-        text = text.replace("+", "plus").replace("&", "and").replace("r/", "")
-        text_chunks = chunk_text(text)
-        print_substep(f"Splitted text-to-speech content into {len(text_chunks)} chunks")
+        tts_settings = settings.config["settings"]["tts"]
+        self.max_in_flight = int(tts_settings.get("tiktok_max_in_flight", 4))
+        self.timeout = float(tts_settings.get("tiktok_timeout", 30))
+        self.retries = int(tts_settings.get("tiktok_retries", 4))
 
-        total_duration = 0  # Initialize total duration
-        for i, chunk in enumerate(text_chunks):
-            params = {"text": chunk}
-            if voice is not None:
-                params["voice"] = voice
+        self._headers = headers
+        self._local = threading.local()
+        self._session = self._thread_session()
 
+    def voices(self) -> List[str]:
+        return list(eng_voices + non_eng_voices + vocals + disney_voices)
+
+    def default_voice(self) -> Optional[str]:
+        return settings.config["settings"]["tts"].get("tiktok_voice", None)
+
+    def get_voices(self, text: str, voice: Optional[str] = None, output_filename: str = "output") -> float:
+        """Downloads MP3 audio files for each chunk of text, saves them, and calculates total duration."""
+        return super().get_voices(text, voice, output_filename)
+
+    def _thread_session(self) -> requests.Session:
+        """One session per thread, requests.Session is not guaranteed to be thread-safe."""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            # set the headers to the session, so we don't have to do it for every request
+            session.headers = self._headers
+            self._local.session = session
+        return session
+
+    def _post(self, params: dict) -> Optional[requests.Response]:
+        """POSTs to the API, retrying connection errors, timeouts, 429 and 5xx
+        with jittered exponential backoff."""
+        response = None
+        for attempt in range(self.retries + 1):
             try:
-                print_substep(f"Generating audio for chunk {i + 1}/{len(text_chunks)}")
-                response = self._session.post(self.URI_BASE, json=params)
-            except ConnectionError:
-                time.sleep(random.randrange(1, 7))
-                response = self._session.post(self.URI_BASE, json=params)
-
-            if response.status_code == 200 and response.headers.get('Content-Type') == 'application/octet-stream':
-                chunk_filename = f"{self.path}/{output_filename}_chunk_{i + 1}.mp3"
-                with open(chunk_filename, 'wb') as audio_file:
-                    audio_file.write(response.content)
-                print_substep(f"Chunk {i + 1} saved successfully as {chunk_filename}")
-
-                # Calculate the duration of the chunk and add it to the total
-                chunk_audio = AudioSegment.from_mp3(chunk_filename)
-                chunk_duration = chunk_audio.duration_seconds
-                total_duration += chunk_duration
-                del chunk_audio
-            else:
-                print_substep(f"Failed to download chunk {i + 1}. Status code: {response.status_code}")
-
-        return [total_duration, len(text_chunks)]  # Return total duration of all chunks
-
-    @staticmethod
-    def random_voice() -> str:
+                with tracer.span("tts_request", cat="tts", chars=len(params["text"]), attempt=attempt):
+                    response = self._thread_session().post(self.URI_BASE, json=params, timeout=self.timeout)
+                if response.status_code != 429 and response.status_code < 500:
+                    return response
+            except requests.exceptions.RequestException:
+                response = None
+            if attempt < self.retries:
+                time.sleep(min(2 ** attempt, 30) * random.uniform(0.5, 1.5))
+        return response
+
+    def synthesize_chunk_to(self, chunk: str, voice: Optional[str], filename: str) -> bool:
+        """Downloads a single chunk into filename"""
+        params = {"text": chunk}
+        if voice is not None:
+            params["voice"] = voice
+
+        response = self._post(params)
+
+        if response is not None and response.status_code == 200 and response.headers.get('Content-Type') == 'application/octet-stream':
+            with open(filename, 'wb') as audio_file:
+                audio_file.write(response.content)
+            return True
+
+        status_code = response.status_code if response is not None else "no response"
+        print_substep(f"Failed to download {filename}. Status code: {status_code}")
+        return False
+
+    def random_voice(self) -> str:
         return random.choice(eng_voices)
 
 
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # windows, no reflinks
+    fcntl = None
+
+FICLONE: int = 0x40049409  # linux ioctl, clones a file sharing its extents
+
+
+def normalize_chunk_text(text: str) -> str:
+    return " ".join(text.split())
+
+
+def place_file(source: str, destination: str):
+    """Makes destination a copy of source without copying bytes when possible:
+    a hardlink on the same filesystem, a reflink on CoW filesystems, a plain copy otherwise.
+    """
+    if os.path.exists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+        return
+    except OSError:
+        pass
+    if fcntl is not None:
+        try:
+            with open(source, "rb") as src, open(destination, "wb") as dst:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            return
+        except OSError:
+            pass
+    shutil.copyfile(source, destination)
+
+
+class TTSCache:
+    """Content-addressed, size bounded cache of synthesized TTS chunks.
+
+    Files live in {root}/{key[:2]}/{key}.mp3, keyed by a hash of
+    (provider, voice, normalized text). The index is a sqlite database, so
+    several worker processes can share the same cache. When the cache grows
+    past max_bytes the least recently used chunks are evicted.
+    """
+
+    def __init__(self, root: str = "assets/cache/tts", max_bytes: int = 2 * 1024**3):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                "key TEXT PRIMARY KEY, size INTEGER, duration REAL, last_access REAL)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """A connection to the index, committed (or rolled back) and closed on exit."""
+        db = sqlite3.connect(os.path.join(self.root, "index.sqlite"), timeout=30)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    @staticmethod
+    def key(provider: str, voice: Optional[str], text: str) -> str:
+        payload = json.dumps([provider, voice or "", normalize_chunk_text(text)], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.mp3")
+
+    def contains(self, key: str) -> bool:
+        with self._connect() as db:
+            return db.execute("SELECT 1 FROM chunks WHERE key = ?", (key,)).fetchone() is not None
+
+    def get(self, key: str, destination: str) -> Optional[float]:
+        """Places the cached chunk at destination.
+
+        Returns:
+            float: Duration of the chunk in seconds, None on a cache miss
+        """
+        with self._connect() as db:
+            row = db.execute("SELECT duration FROM chunks WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            try:
+                place_file(self._path(key), destination)
+            except FileNotFoundError:  # evicted by another process
+                db.execute("DELETE FROM chunks WHERE key = ?", (key,))
+                return None
+            db.execute("UPDATE chunks SET last_access = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+    def put(self, key: str, source: str, duration: float):
+        """Stores the chunk at source under key and evicts old chunks if needed."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # place into a temporary name first, so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        os.close(fd)
+        place_file(source, tmp_path)
+        os.replace(tmp_path, path)
+
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO chunks (key, size, duration, last_access) VALUES (?, ?, ?, ?)",
+                (key, os.path.getsize(path), duration, time.time()),
+            )
+        self.evict()
+
+    def evict(self) -> Tuple[int, int]:
+        """Removes the least recently used chunks until the cache fits in max_bytes.
+
+        Returns:
+            tuple[int,int]: (chunks removed, bytes freed)
+        """
+        removed, freed = 0, 0
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM chunks").fetchone()[0]
+            if total <= self.max_bytes:
+                return removed, freed
+            for key, size in db.execute("SELECT key, size FROM chunks ORDER BY last_access").fetchall():
+                if total - freed <= self.max_bytes:
+                    break
+                db.execute("DELETE FROM chunks WHERE key = ?", (key,))
+                try:
+                    os.remove(self._path(key))
+                except FileNotFoundError:
+                    pass
+                removed += 1
+                freed += size
+        return removed, freed
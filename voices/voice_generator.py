@@ -2,16 +2,20 @@ from typing import Tuple
 
 from rich.console import Console
 
+from .espeak import ESpeak
 from .tiktok import TikTok
 from utils import settings
-from utils.console import print_step, print_table
+from utils.console import print_step, print_substep, print_table
+from utils.tracing import traced
 
 console = Console()
 
 TTSProviders = {
-    "TikTok": TikTok,
+    "tiktok": TikTok,
+    "espeak": ESpeak,
 }
 
+@traced()
 def save_text_to_mp3(obj) -> Tuple[int, int]:
     """Saves text to MP3 files.
 
@@ -22,11 +26,11 @@ def save_text_to_mp3(obj) -> Tuple[int, int]:
         tuple[int,int]: (total length of the audio, the number of comments audio was generated for)
     """
     # retrieve voice choice from config.toml file
-    voice = settings.config["settings"]["tts"]["voice_choice"]
-    if(str(voice).casefold() != 'tiktok'):
+    voice = str(settings.config["settings"]["tts"]["voice_choice"]).casefold()
+    if voice not in TTSProviders:
+        print_substep(f"The TTS provider {voice} is not supported, choose one of {', '.join(TTSProviders)}", style="bold red")
         return
     # create the text-2-speech engine
-    engine = TikTok(identifier=obj["id"])
-    [total_duration, number_of_clips] =  engine.run(text=obj["text"])
+    engine = TTSProviders[voice](identifier=obj["id"])
+    [total_duration, number_of_clips] = engine.run(text=obj["text"])
     return [total_duration, number_of_clips]
-